@@ -1,12 +1,11 @@
 from __future__ import annotations
 
-import asyncio
 import json
 import os
 from pathlib import Path
 from typing import Optional
 
-from openai import OpenAI
+from openai import AsyncOpenAI
 
 CONFIG_PATH = Path("assistant_config.json")
 ASSISTANT_NAME = "Image-Gen Loop Prompter"
@@ -18,12 +17,12 @@ ASSISTANT_INSTRUCTIONS = (
 MODEL_NAME = "gpt-4o"
 
 
-def get_client() -> OpenAI:
-    """Create an OpenAI client using the API key from the environment."""
+def get_async_client() -> AsyncOpenAI:
+    """Create an asynchronous OpenAI client using the API key from the environment."""
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise ValueError("OPENAI_API_KEY environment variable is required")
-    return OpenAI(api_key=api_key)
+    return AsyncOpenAI(api_key=api_key)
 
 
 async def create_assistant() -> str:
@@ -32,9 +31,8 @@ async def create_assistant() -> str:
     Returns:
         str: The created assistant ID.
     """
-    client = get_client()
-    assistant = await asyncio.to_thread(
-        client.beta.assistants.create,
+    client = get_async_client()
+    assistant = await client.beta.assistants.create(
         name=ASSISTANT_NAME,
         instructions=ASSISTANT_INSTRUCTIONS,
         model=MODEL_NAME,
@@ -1,12 +1,261 @@
 import argparse
 import asyncio
 import json
+import sys
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 
-from .loop_controller import run_image_generation_loop
+from . import (
+    context_window,
+    evaluator,
+    generation_cache,
+    image_gen,
+    metrics,
+    offload,
+    pipeline,
+    run_archive,
+)
+from .derivatives import DerivativeSpec
+from .loop_controller import (
+    SCORE_THRESHOLD,
+    iterate_image_generation_loop,
+    run_image_generation_loop,
+)
+
+
+def history_main(argv: list[str]) -> None:
+    """Query the run archive: ``python -m agentic_image_gen history ...``."""
+    parser = argparse.ArgumentParser(
+        prog="agentic_image_gen history", description="Query archived image generation runs"
+    )
+    parser.add_argument(
+        "--db",
+        default=str(run_archive.DEFAULT_ARCHIVE_PATH),
+        help=f"Run archive database. Defaults to '{run_archive.DEFAULT_ARCHIVE_PATH}'.",
+    )
+    parser.add_argument("--since-days", type=float, default=None, help="Only runs started in the last N days.")
+    parser.add_argument("--category", default=None, help="Only runs in this product category.")
+    parser.add_argument("--limit", type=int, default=20, help="Maximum number of runs to list.")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--stats",
+        action="store_true",
+        help="Per-category run count, threshold rate, average iterations to threshold and score.",
+    )
+    group.add_argument("--run", type=int, default=None, help="Show every iteration of one run ID.")
+    args = parser.parse_args(argv)
+
+    if args.stats:
+        rows = run_archive.run_stats(args.db, since_days=args.since_days, category=args.category)
+    elif args.run is not None:
+        rows = run_archive.get_iterations(args.db, args.run)
+    else:
+        rows = run_archive.list_runs(
+            args.db, since_days=args.since_days, category=args.category, limit=args.limit
+        )
+    print(json.dumps(rows, indent=2))
+
+
+def _add_cascade_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--eval-cascade-margin",
+        type=float,
+        default=None,
+        metavar="POINTS",
+        help=(
+            f"Score images with {evaluator.FIRST_PASS_MODEL} first and run the full evaluation only "
+            f"when that score is within POINTS of the threshold or the first pass is unsure. "
+            f"Typical value: {evaluator.DEFAULT_CASCADE_MARGIN}."
+        ),
+    )
+    parser.add_argument(
+        "--eval-cascade-audit",
+        type=float,
+        default=0.0,
+        metavar="FRACTION",
+        help="Fraction of trusted first-pass scores evaluated in full anyway to measure agreement.",
+    )
+
+
+def _add_runtime_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--offload-workers",
+        type=int,
+        default=None,
+        help="Worker count for the pool that runs base64, decoding and file I/O off the event loop.",
+    )
+    parser.add_argument(
+        "--offload-processes",
+        action="store_true",
+        help="Run CPU-bound offloaded work (base64, image decoding) in a process pool.",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="Serve Prometheus metrics at http://HOST:PORT/metrics while the command runs.",
+    )
+    parser.add_argument(
+        "--metrics-host",
+        default=metrics.DEFAULT_HTTP_HOST,
+        help=(
+            f"Interface the metrics endpoint binds to. Defaults to {metrics.DEFAULT_HTTP_HOST}; "
+            "use 0.0.0.0 to expose it on every interface."
+        ),
+    )
+    parser.add_argument(
+        "--metrics-textfile",
+        default=None,
+        help="Write Prometheus metrics to this file when the command finishes (textfile collector).",
+    )
+
+
+@asynccontextmanager
+async def _runtime(args: argparse.Namespace) -> AsyncIterator[None]:
+    """Configure offloading and metrics for a command, and release shared resources after it."""
+    offload.configure(max_workers=args.offload_workers, use_processes=args.offload_processes)
+    metrics_runner = None
+    if args.metrics_port is not None:
+        metrics_runner = await metrics.start_http_server(args.metrics_port, host=args.metrics_host)
+    try:
+        yield
+    finally:
+        if args.metrics_textfile:
+            metrics.write_textfile(args.metrics_textfile)
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await image_gen.close_reference_session()
+        offload.shutdown()
+
+
+def _cascade_policy(args: argparse.Namespace) -> evaluator.CascadePolicy | None:
+    if args.eval_cascade_margin is None:
+        return None
+    return evaluator.CascadePolicy(
+        threshold=SCORE_THRESHOLD,
+        margin=args.eval_cascade_margin,
+        audit_fraction=args.eval_cascade_audit,
+    )
+
+
+async def batch_main(argv: list[str]) -> None:
+    """Run many prompts through the staged pipeline: ``python -m agentic_image_gen batch ...``."""
+    parser = argparse.ArgumentParser(
+        prog="agentic_image_gen batch",
+        description="Run a file of prompts through separately sized generate, evaluate and refine stages",
+    )
+    parser.add_argument(
+        "jobs",
+        help='JSON-lines file with one job per line: {"prompt": "...", "refs": ["..."]}',
+    )
+    parser.add_argument("--quality", default="auto", choices=["auto", "low", "medium", "high"])
+    parser.add_argument("--size", default="1024x1024", choices=["auto", "1024x1024", "1024x1536", "1536x1024"])
+    parser.add_argument("--background", default="auto", choices=["auto", "opaque", "transparent"])
+    parser.add_argument("--format", default="png", choices=["png", "jpeg", "webp"])
+    parser.add_argument("--eval-fidelity", default=evaluator.DEFAULT_FIDELITY, choices=list(evaluator.FIDELITY_TIERS))
+    _add_cascade_arguments(parser)
+    for stage in pipeline.STAGES:
+        parser.add_argument(
+            f"--{stage}-workers",
+            type=int,
+            default=pipeline.DEFAULT_STAGES[stage].workers,
+            help=f"Concurrent {stage} workers. Defaults to {pipeline.DEFAULT_STAGES[stage].workers}.",
+        )
+        parser.add_argument(
+            f"--{stage}-queue",
+            type=int,
+            default=pipeline.DEFAULT_STAGES[stage].queue_size,
+            help=f"Jobs that may wait for the {stage} stage. Defaults to {pipeline.DEFAULT_STAGES[stage].queue_size}.",
+        )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=None,
+        help="Maximum jobs in the pipeline at once. Defaults to the largest deadlock-free value.",
+    )
+    parser.add_argument(
+        "--report-interval",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Print per-stage queue depths and busy workers to stderr at this interval.",
+    )
+    parser.add_argument("--hedge", action="store_true", help="Hedge slow generation and evaluation calls.")
+    parser.add_argument("--background-mode", action="store_true", help="Submit generations in background mode.")
+    parser.add_argument("--pack-refs", action="store_true", help="Pack secondary references into a contact sheet.")
+    _add_runtime_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with open(args.jobs, encoding="utf-8") as f:
+        jobs = [line for line in f if line.strip()]
+    async with _runtime(args):
+        await _run_batch(args, jobs)
+
+
+async def _run_batch(args: argparse.Namespace, jobs: list[str]) -> None:
+    """Run batch jobs through the pipeline and print one result line per job."""
+    stages = {
+        stage: pipeline.StageConfig(
+            workers=getattr(args, f"{stage}_workers"), queue_size=getattr(args, f"{stage}_queue")
+        )
+        for stage in pipeline.STAGES
+    }
+    async with pipeline.Pipeline(
+        args.quality,
+        args.size,
+        args.background,
+        args.format,
+        stages=stages,
+        max_in_flight=args.max_in_flight,
+        evaluation_fidelity=args.eval_fidelity,
+        evaluation_cascade=_cascade_policy(args),
+        hedge_requests=args.hedge,
+        background_mode=args.background_mode,
+        pack_references=args.pack_refs,
+    ) as runner:
+        reporter = None
+        if args.report_interval:
+            reporter = asyncio.create_task(_report_pipeline(runner, args.report_interval))
+
+        async def run_job(index: int, line: str) -> None:
+            prompt = None
+            try:
+                job = json.loads(line)
+                prompt = job.get("prompt") if isinstance(job, dict) else None
+                if not isinstance(prompt, str) or not prompt.strip():
+                    raise ValueError('job needs a non-empty "prompt" string')
+                future = await runner.submit(prompt, job.get("refs"))
+                output = {"index": index, "prompt": prompt, **await future}
+            except Exception as e:
+                output = {"index": index, "prompt": prompt, "error": str(e)}
+            print(json.dumps(output), flush=True)
+
+        try:
+            # A failing job reports its error line; it must not cancel the others.
+            await asyncio.gather(
+                *(run_job(index, line) for index, line in enumerate(jobs)), return_exceptions=True
+            )
+        finally:
+            if reporter is not None:
+                reporter.cancel()
+
+
+async def _report_pipeline(runner: pipeline.Pipeline, interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        report = {"queue_depths": runner.queue_depths(), "busy_workers": runner.busy_workers()}
+        print(json.dumps(report), file=sys.stderr, flush=True)
 
 
 async def main() -> None:
     """Run the image generation loop from the command line."""
+    if sys.argv[1:2] == ["history"]:
+        history_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["batch"]:
+        await batch_main(sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(description="Agentic image generation CLI")
     parser.add_argument("prompt", help="Initial text prompt")
     parser.add_argument(
@@ -39,16 +288,146 @@ async def main() -> None:
         choices=["png", "jpeg", "webp"],
         help="Output format of the generated image. Defaults to 'png'."
     )
+    parser.add_argument(
+        "--eval-fidelity",
+        default=evaluator.DEFAULT_FIDELITY,
+        choices=list(evaluator.FIDELITY_TIERS),
+        help=(
+            "Image fidelity sent to the evaluator: 'full' original image, 'low' downscaled "
+            "JPEG, or 'low_crop' downscaled JPEG plus a full-resolution product crop. "
+            "Defaults to 'full'."
+        ),
+    )
+    _add_cascade_arguments(parser)
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Print loop events as NDJSON lines as they happen instead of one final JSON blob.",
+    )
+    parser.add_argument(
+        "--derivatives",
+        nargs="*",
+        type=DerivativeSpec.parse,
+        default=None,
+        metavar="WxH[:FORMAT[:MODE[:#BACKGROUND]]]",
+        help=(
+            "Renditions derived locally from the best image, e.g. '1024x1024:png' "
+            "'1536x1024:jpeg:crop' '256x256:webp:pad:#ffffff'. MODE is fit, crop or pad."
+        ),
+    )
+    parser.add_argument(
+        "--context-tokens",
+        type=int,
+        default=context_window.DEFAULT_TOKEN_BUDGET,
+        help="Approximate token budget for the history of earlier iterations sent to the prompter.",
+    )
+    parser.add_argument(
+        "--prompt-index",
+        default=None,
+        metavar="PATH",
+        help=(
+            "JSON-lines file of past run outcomes. Warm-starts the prompt from similar past "
+            "winning runs and records this run's result."
+        ),
+    )
+    parser.add_argument(
+        "--category",
+        default=None,
+        help="Product category recorded with the run in the archive.",
+    )
+    parser.add_argument(
+        "--archive",
+        default=str(run_archive.DEFAULT_ARCHIVE_PATH),
+        metavar="PATH",
+        help=f"SQLite run archive to record this run in. Defaults to '{run_archive.DEFAULT_ARCHIVE_PATH}'.",
+    )
+    parser.add_argument(
+        "--no-archive",
+        action="store_true",
+        help="Do not record this run in the archive.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="Directory for a content-addressed cache of generated images, so replays are served locally.",
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=int,
+        default=generation_cache.DEFAULT_MAX_BYTES // (1024 * 1024),
+        help="Size cap of the generation cache in MiB before least recently used entries are evicted.",
+    )
+    parser.add_argument(
+        "--pack-refs",
+        action="store_true",
+        help="Tile every reference after the first into one labeled contact sheet to cut input image tokens.",
+    )
+    parser.add_argument(
+        "--background-mode",
+        action="store_true",
+        help="Submit generations in background mode and poll for results instead of holding requests open.",
+    )
+    parser.add_argument(
+        "--hedge",
+        action="store_true",
+        help=(
+            "Send a duplicate generation/evaluation request when a call exceeds the observed "
+            "p90 latency; the first success wins. Capped at 10%% of calls per stage."
+        ),
+    )
+    _add_runtime_arguments(parser)
 
     args = parser.parse_args()
 
+    async with _runtime(args):
+        await _run(args)
+
+
+async def _run(args: argparse.Namespace) -> None:
+    """Run the loop for parsed CLI arguments and print its output."""
+    if args.stream:
+        async for event in iterate_image_generation_loop(
+            args.prompt,
+            args.refs,
+            args.quality,
+            args.size,
+            args.background,
+            args.format,
+            evaluation_fidelity=args.eval_fidelity,
+            evaluation_cascade=_cascade_policy(args),
+            hedge_requests=args.hedge,
+            background_mode=args.background_mode,
+            pack_references=args.pack_refs,
+            derivatives=args.derivatives,
+            context_token_budget=args.context_tokens,
+            prompt_index_path=args.prompt_index,
+            archive_path=None if args.no_archive else args.archive,
+            category=args.category,
+            cache_dir=args.cache_dir,
+            cache_max_bytes=args.cache_max_mb * 1024 * 1024,
+        ):
+            print(json.dumps(event.to_dict()), flush=True)
+        return
+
     result = await run_image_generation_loop(
         args.prompt, 
         args.refs,
         args.quality,
         args.size,
         args.background,
-        args.format
+        args.format,
+        evaluation_fidelity=args.eval_fidelity,
+        evaluation_cascade=_cascade_policy(args),
+        hedge_requests=args.hedge,
+        background_mode=args.background_mode,
+        pack_references=args.pack_refs,
+        derivatives=args.derivatives,
+        context_token_budget=args.context_tokens,
+        prompt_index_path=args.prompt_index,
+        archive_path=None if args.no_archive else args.archive,
+        category=args.category,
+        cache_dir=args.cache_dir,
+        cache_max_bytes=args.cache_max_mb * 1024 * 1024,
     )
     print(json.dumps(result, indent=2))
 
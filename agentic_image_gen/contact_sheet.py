@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import math
+import os
+import tempfile
+import uuid
+from contextlib import ExitStack
+from pathlib import Path
+from urllib.parse import urlparse
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+
+from . import image_hash
+
+TILE_SIZE = 512
+LABEL_HEIGHT = 28
+LABEL_MAX_CHARS = 48
+SHEET_BACKGROUND = (255, 255, 255)
+LABEL_COLOR = (40, 40, 40)
+JPEG_QUALITY = 90
+# Bumped whenever the layout changes, so stale cached sheets are not reused.
+LAYOUT_VERSION = 1
+DEFAULT_CACHE_DIR = Path(tempfile.gettempdir()) / "agentic_image_gen_contact_sheets"
+# Least recently used sheets are deleted once the cache directory exceeds this size.
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def reference_label(index: int, source: str) -> str:
+    """Label a tile with its number and the reference's file name."""
+    name = Path(urlparse(source).path).name or source
+    label = f"{index}. {name}"
+    return label if len(label) <= LABEL_MAX_CHARS else label[: LABEL_MAX_CHARS - 3] + "..."
+
+
+def reference_set_key(sources: list[str], tile_size: int = TILE_SIZE) -> str:
+    """Hash an ordered reference set and the layout into a contact-sheet cache key."""
+    payload = {
+        "version": LAYOUT_VERSION,
+        "tile_size": tile_size,
+        "references": [image_hash.reference_fingerprint(src) for src in sources],
+    }
+    encoded = json.dumps(payload, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def sheet_path(key: str, cache_dir: str | Path | None = None) -> Path:
+    """Return where the contact sheet for ``key`` is cached."""
+    return Path(cache_dir or DEFAULT_CACHE_DIR) / f"{key}.jpeg"
+
+
+def _tile_pixels(img: Image.Image, tile_size: int) -> np.ndarray:
+    """Fit an image into a transparent square tile and return its RGBA pixels."""
+    fitted = ImageOps.contain(img.convert("RGBA"), (tile_size, tile_size), Image.Resampling.LANCZOS)
+    tile = Image.new("RGBA", (tile_size, tile_size), (0, 0, 0, 0))
+    tile.paste(fitted, ((tile_size - fitted.width) // 2, (tile_size - fitted.height) // 2))
+    return np.asarray(tile)
+
+
+def compose_contact_sheet(
+    images: list[Image.Image],
+    labels: list[str],
+    tile_size: int = TILE_SIZE,
+    background: tuple[int, int, int] = SHEET_BACKGROUND,
+) -> Image.Image:
+    """Tile images into one labeled grid, as close to square as possible.
+
+    All tiles are alpha-composited onto the background and arranged into the grid
+    in single array operations; only the labels are drawn per tile.
+
+    Returns:
+        An RGB image with one ``tile_size`` cell plus a label strip per image.
+    """
+    columns = math.ceil(math.sqrt(len(images)))
+    rows = math.ceil(len(images) / columns)
+    cell_height = tile_size + LABEL_HEIGHT
+
+    tiles = np.zeros((rows * columns, cell_height, tile_size, 4), dtype=np.float32)
+    tiles[: len(images), :tile_size] = np.stack([_tile_pixels(img, tile_size) for img in images])
+    alpha = tiles[..., 3:] / 255.0
+    rgb = tiles[..., :3] * alpha + np.asarray(background, dtype=np.float32) * (1.0 - alpha)
+    grid = (
+        rgb.reshape(rows, columns, cell_height, tile_size, 3)
+        .transpose(0, 2, 1, 3, 4)
+        .reshape(rows * cell_height, columns * tile_size, 3)
+    )
+    sheet = Image.fromarray(np.rint(grid).astype(np.uint8), mode="RGB")
+
+    draw = ImageDraw.Draw(sheet)
+    font = ImageFont.load_default()
+    for index, label in enumerate(labels[: len(images)]):
+        row, column = divmod(index, columns)
+        draw.text(
+            (column * tile_size + 8, row * cell_height + tile_size + 6), label, fill=LABEL_COLOR, font=font
+        )
+    return sheet
+
+
+def write_contact_sheet(
+    images_data: list[bytes | str], labels: list[str], output_path: str, tile_size: int = TILE_SIZE
+) -> str:
+    """Decode reference images, compose their contact sheet and save it as JPEG.
+
+    The file is written atomically, so concurrent writers of the same key are safe.
+
+    Args:
+        images_data: Encoded image bytes or local image paths, in tile order.
+        labels: One label per image.
+        output_path: Where to write the sheet.
+        tile_size: Side length of each tile in pixels.
+
+    Returns:
+        ``output_path``.
+    """
+    with ExitStack() as stack:
+        images = [
+            stack.enter_context(Image.open(io.BytesIO(data) if isinstance(data, bytes) else data))
+            for data in images_data
+        ]
+        sheet = compose_contact_sheet(images, labels, tile_size)
+    path = Path(output_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+    sheet.save(tmp_path, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+    os.replace(tmp_path, path)
+    return output_path
+
+
+def prune_cache(cache_dir: str | Path | None = None, max_bytes: int = MAX_CACHE_BYTES) -> None:
+    """Delete least recently used sheets until the cache fits in ``max_bytes``.
+
+    Recency is the sheet's modification time, which callers refresh on every hit.
+    """
+    entries = []
+    total = 0
+    for path in Path(cache_dir or DEFAULT_CACHE_DIR).glob("*.jpeg"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, path, stat.st_size))
+        total += stat.st_size
+    for _, path, size in sorted(entries, key=lambda entry: entry[0]):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+
+DEFAULT_TOKEN_BUDGET = 600
+# Assistant thread messages the model sees per run; older ones are truncated server-side.
+THREAD_RECENT_MESSAGES = 4
+PROMPT_WORD_LIMIT = 40
+FEEDBACK_WORD_LIMIT = 30
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimate the token count of English text (about four characters per token)."""
+    return (len(text) + 3) // 4
+
+
+def _truncate_words(text: str, limit: int) -> str:
+    words = text.split()
+    if len(words) <= limit:
+        return " ".join(words)
+    return " ".join(words[:limit]) + " ..."
+
+
+def _key_feedback(feedback: str) -> str:
+    """Keep the leading sentences of a critique, which carry the main verdict."""
+    sentences = re.split(r"(?<=[.!?])\s+", feedback.strip())
+    return _truncate_words(" ".join(sentences[:2]), FEEDBACK_WORD_LIMIT)
+
+
+@dataclass
+class _Attempt:
+    iteration: int
+    prompt: str
+    score: int
+    feedback: str
+
+
+class ContextWindow:
+    """Compact history of earlier loop iterations, bounded by a token budget.
+
+    Newer iterations are kept in most detail; older ones shrink to a score line and
+    are finally dropped, so the prompter's input stays roughly constant in size.
+    """
+
+    def __init__(self, token_budget: int = DEFAULT_TOKEN_BUDGET) -> None:
+        self.token_budget = token_budget
+        self._attempts: list[_Attempt] = []
+
+    def add(self, iteration: int, prompt: str, score: int, feedback: str) -> None:
+        """Record a scored iteration."""
+        self._attempts.append(_Attempt(iteration, prompt, score, feedback))
+
+    def render(self) -> str:
+        """Render the history within the token budget, oldest attempt first.
+
+        Returns:
+            The summary text, or an empty string if nothing has been recorded.
+        """
+        if not self._attempts:
+            return ""
+        best = max(self._attempts, key=lambda attempt: attempt.score)
+        header = f"Best so far: iteration {best.iteration} scored {best.score}."
+        remaining = self.token_budget - estimate_tokens(header)
+
+        lines: list[str] = []
+        omitted = 0
+        for index, attempt in enumerate(reversed(self._attempts)):
+            detailed = (
+                f"- Iteration {attempt.iteration} (score {attempt.score}): "
+                f"prompt: {_truncate_words(attempt.prompt, PROMPT_WORD_LIMIT)} | "
+                f"feedback: {_key_feedback(attempt.feedback)}"
+            )
+            compact = f"- Iteration {attempt.iteration} (score {attempt.score})"
+            for line in (detailed, compact):
+                cost = estimate_tokens(line)
+                if cost <= remaining:
+                    lines.append(line)
+                    remaining -= cost
+                    break
+            else:
+                omitted = len(self._attempts) - index
+                break
+        if omitted:
+            lines.append(f"- {omitted} earlier iteration(s) omitted")
+        return "\n".join([header, *reversed(lines)])
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+import re
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+from . import image_processing, offload
+
+FORMATS = ("png", "jpeg", "webp")
+MODES = ("fit", "crop", "pad")
+JPEG_QUALITY = 90
+WEBP_QUALITY = 85
+_HEX_COLOR_RE = re.compile(r"#?[0-9a-fA-F]{6}")
+
+
+@dataclass(frozen=True)
+class DerivativeSpec:
+    """One output rendition derived locally from the best image.
+
+    Attributes:
+        width: Target width in pixels.
+        height: Target height in pixels.
+        output_format: File format (png, jpeg, webp).
+        mode: ``fit`` scales inside the box, ``crop`` fills the box and crops around
+            the product, ``pad`` fits and pads to exactly the box size.
+        background: Hex colour to flatten transparency onto, or None to keep alpha.
+            JPEG output is always flattened (white by default).
+    """
+
+    width: int
+    height: int
+    output_format: str = "png"
+    mode: str = "fit"
+    background: str | None = None
+
+    @property
+    def name(self) -> str:
+        parts = [f"{self.width}x{self.height}", self.output_format, self.mode]
+        if self.background:
+            parts.append(self.background)
+        return ":".join(parts)
+
+    @classmethod
+    def parse(cls, text: str) -> "DerivativeSpec":
+        """Parse ``WIDTHxHEIGHT[:format[:mode[:#background]]]``, e.g. ``1536x1024:jpeg:crop``."""
+        size, *rest = text.split(":")
+        try:
+            width, height = (int(value) for value in size.lower().split("x"))
+        except ValueError:
+            raise ValueError(f"Invalid derivative size {size!r} in {text!r}") from None
+        output_format = rest[0].lower() if len(rest) > 0 else "png"
+        mode = rest[1].lower() if len(rest) > 1 else "fit"
+        background = rest[2] if len(rest) > 2 else None
+        if output_format == "jpg":
+            output_format = "jpeg"
+        if output_format not in FORMATS:
+            raise ValueError(f"Invalid derivative format {output_format!r}; expected one of {FORMATS}")
+        if mode not in MODES:
+            raise ValueError(f"Invalid derivative mode {mode!r}; expected one of {MODES}")
+        if width <= 0 or height <= 0:
+            raise ValueError(f"Invalid derivative size {size!r} in {text!r}")
+        if background is not None and not _HEX_COLOR_RE.fullmatch(background):
+            raise ValueError(f"Invalid derivative background {background!r}; expected #rrggbb")
+        return cls(width, height, output_format, mode, background)
+
+
+def _hex_to_rgb(color: str) -> tuple[int, int, int]:
+    """Convert a ``#rrggbb`` colour, already validated by ``DerivativeSpec.parse``."""
+    value = color.lstrip("#")
+    return int(value[0:2], 16), int(value[2:4], 16), int(value[4:6], 16)
+
+
+def _product_centering(img: Image.Image) -> tuple[float, float]:
+    """Return the product's centre as fractions of the frame, for centring crops."""
+    box = image_processing.product_bounding_box(img, padding=0)
+    if box is None:
+        return 0.5, 0.5
+    left, top, right, bottom = box
+    return (left + right) / 2 / img.width, (top + bottom) / 2 / img.height
+
+
+def render_derivative(source_path: str, spec: DerivativeSpec, output_path: str) -> str:
+    """Render one derivative of ``source_path`` to ``output_path``.
+
+    Returns:
+        ``output_path``.
+    """
+    with Image.open(source_path) as source:
+        img = source.convert("RGBA")
+
+    target = (spec.width, spec.height)
+    if spec.mode == "crop":
+        img = ImageOps.fit(img, target, Image.Resampling.LANCZOS, centering=_product_centering(img))
+    else:
+        img = ImageOps.contain(img, target, Image.Resampling.LANCZOS)
+        if spec.mode == "pad":
+            canvas = Image.new("RGBA", target, (0, 0, 0, 0))
+            canvas.paste(img, ((spec.width - img.width) // 2, (spec.height - img.height) // 2))
+            img = canvas
+
+    if spec.background or spec.output_format == "jpeg":
+        img = image_processing.flatten_onto_background(img, _hex_to_rgb(spec.background or "#ffffff"))
+
+    save_kwargs: dict = {}
+    if spec.output_format == "jpeg":
+        save_kwargs = {"quality": JPEG_QUALITY, "optimize": True}
+    elif spec.output_format == "webp":
+        save_kwargs = {"quality": WEBP_QUALITY, "method": 4}
+    img.save(output_path, format=spec.output_format.upper(), **save_kwargs)
+    return output_path
+
+
+def _output_path(source_path: str, spec: DerivativeSpec, output_dir: str | None) -> str:
+    source = Path(source_path)
+    directory = Path(output_dir) if output_dir else source.parent
+    suffix = f"{spec.width}x{spec.height}_{spec.mode}"
+    if spec.background:
+        suffix += f"_{spec.background.lstrip('#')}"
+    return str(directory / f"{source.stem}_{suffix}.{spec.output_format}")
+
+
+async def render_derivatives(
+    source_path: str,
+    specs: list[DerivativeSpec],
+    output_dir: str | None = None,
+) -> dict[str, str]:
+    """Render every derivative of an image in parallel in the shared ``offload`` pool.
+
+    Args:
+        source_path: Path to the image to derive from.
+        specs: The renditions to produce.
+        output_dir: Directory for the outputs (defaults to the source image's directory).
+
+    Returns:
+        A mapping of each successfully rendered spec's name to its output path.
+    """
+    results = await asyncio.gather(
+        *(
+            offload.run_cpu(
+                render_derivative, source_path, spec, _output_path(source_path, spec, output_dir)
+            )
+            for spec in specs
+        ),
+        return_exceptions=True,
+    )
+
+    paths: dict[str, str] = {}
+    for spec, result in zip(specs, results):
+        if isinstance(result, BaseException):
+            print(f"Warning: Failed to render derivative {spec.name} of {source_path}: {result}", file=sys.stderr)
+        else:
+            paths[spec.name] = result
+    return paths
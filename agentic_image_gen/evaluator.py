@@ -1,15 +1,20 @@
 from __future__ import annotations
 
-import asyncio
 import base64
 import json
 import os
+import random
 import re
 import sys
+import time
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Any
 
 from openai import AsyncOpenAI
+from PIL import Image
+
+from . import hedging, image_processing, metrics, offload
 
 SYSTEM_PROMPT = (
     'You are an expert jewelry photography critic. Your primary task is to evaluate how faithfully a generated image reproduces a jewelry product based on the user\'s prompt. ' 
@@ -32,6 +37,111 @@ SYSTEM_PROMPT = (
     'Your feedback should be specific, actionable, and clearly distinguish between successes/failures in product representation versus contextual elements. If product accuracy is low, the overall score should reflect this significantly, even if the background scene is well-rendered.'
 )
 
+# Evaluation fidelity tiers:
+#   full     - the original image as-is at high detail.
+#   low      - a downscaled JPEG of the whole frame at low detail.
+#   low_crop - the low-detail frame plus a full-resolution crop of the product region.
+FIDELITY_TIERS = ("full", "low", "low_crop")
+DEFAULT_FIDELITY = "full"
+LOW_DETAIL_MAX_SIDE = 512
+LOW_DETAIL_JPEG_QUALITY = 85
+# Skip the product crop when it would cover more than this fraction of the frame.
+CROP_MAX_AREA_FRACTION = 0.8
+CROP_CAPTION = "Full-resolution crop of the product region for detail inspection:"
+
+# First-pass screening for the evaluator cascade: a cheaper model with a short rubric.
+FIRST_PASS_MODEL = "gpt-4o-mini"
+FIRST_PASS_SYSTEM_PROMPT = (
+    'You screen generated jewelry product photos against the prompt they were made from. '
+    'Score product accuracy and detail first (shape, settings, stones, materials, sharpness), then natural '
+    'integration into the scene, then overall quality and artifacts. '
+    'Respond ONLY with a JSON object: {"score": <0-100>, "confidence": <0-1>, "feedback": <one or two sentences>}. '
+    'Confidence is how likely a careful expert would give a score within 5 points of yours.'
+)
+DEFAULT_CASCADE_MARGIN = 15
+DEFAULT_CASCADE_MIN_CONFIDENCE = 0.7
+
+
+@dataclass
+class CascadePolicy:
+    """When a first-pass score is trusted instead of running the full evaluation.
+
+    Attributes:
+        threshold: The loop's score threshold the margin is measured from.
+        margin: First-pass scores within this distance of ``threshold`` escalate.
+        min_confidence: First-pass verdicts less confident than this escalate.
+        audit_fraction: Share of trusted first-pass verdicts that are evaluated in
+            full anyway, to measure agreement outside the margin.
+        model: Model used for the first pass.
+        fidelity: Fidelity tier of the image sent to the first pass.
+    """
+
+    threshold: int
+    margin: float = DEFAULT_CASCADE_MARGIN
+    min_confidence: float = DEFAULT_CASCADE_MIN_CONFIDENCE
+    audit_fraction: float = 0.0
+    model: str = FIRST_PASS_MODEL
+    fidelity: str = "low"
+
+    def escalation_reason(self, first_pass: dict | None) -> str | None:
+        """Return why a first-pass verdict needs the full evaluation, or None to trust it."""
+        if first_pass is None or not isinstance(first_pass.get("score"), (int, float)):
+            return "error"
+        confidence = first_pass.get("confidence")
+        if not isinstance(confidence, (int, float)) or confidence < self.min_confidence:
+            return "uncertain"
+        if abs(first_pass["score"] - self.threshold) <= self.margin:
+            return "margin"
+        return None
+
+
+def _full_image_content(image_path: str) -> list[dict[str, Any]]:
+    """Build the message content for the full-resolution original image."""
+    b64_data = base64.b64encode(Path(image_path).read_bytes()).decode()
+    return [{"type": "image_url", "image_url": {"url": f"data:image/png;base64,{b64_data}"}}]
+
+
+def _tiered_image_content(image_path: str, fidelity: str) -> list[dict[str, Any]]:
+    """Build the message content for a reduced fidelity tier.
+
+    Falls back to the full-resolution image if the file cannot be decoded locally.
+    """
+    try:
+        with Image.open(image_path) as img:
+            img.load()
+            frame = image_processing.flatten_onto_background(img)
+            box = image_processing.product_bounding_box(img) if fidelity == "low_crop" else None
+    except Exception as e:
+        print(f"Warning: Could not prepare {fidelity} fidelity view of {image_path}: {e}", file=sys.stderr)
+        return _full_image_content(image_path)
+
+    global_view = image_processing.to_data_url(
+        image_processing.downscale(frame, LOW_DETAIL_MAX_SIDE),
+        "JPEG",
+        quality=LOW_DETAIL_JPEG_QUALITY,
+    )
+    content: list[dict[str, Any]] = [
+        {"type": "image_url", "image_url": {"url": global_view, "detail": "low"}}
+    ]
+
+    if box is not None:
+        left, top, right, bottom = box
+        crop_area = (right - left) * (bottom - top)
+        if crop_area <= CROP_MAX_AREA_FRACTION * frame.width * frame.height:
+            crop_url = image_processing.to_data_url(frame.crop(box), "PNG")
+            content.append({"type": "text", "text": CROP_CAPTION})
+            content.append({"type": "image_url", "image_url": {"url": crop_url, "detail": "high"}})
+    return content
+
+
+def _build_image_content(image_path: str, fidelity: str) -> list[dict[str, Any]]:
+    """Build the image parts of the evaluation message for the requested fidelity tier."""
+    if fidelity not in FIDELITY_TIERS:
+        raise ValueError(f"Unknown evaluation fidelity {fidelity!r}; expected one of {FIDELITY_TIERS}")
+    if fidelity == "full":
+        return _full_image_content(image_path)
+    return _tiered_image_content(image_path, fidelity)
+
 
 def _parse_json_response(content: str) -> dict[str, Any]:
     """Extract JSON object from LLM response."""
@@ -48,59 +158,169 @@ def _parse_json_response(content: str) -> dict[str, Any]:
         raise
 
 
-async def evaluate_image(image_path: str, prompt: str) -> dict:
-    """Evaluate an image against a prompt using OpenAI's vision model.
+async def _image_content(image_path: str, fidelity: str) -> list[dict[str, Any]]:
+    """Prepare the image parts of an evaluation message off the event loop."""
+    if Path(image_path).exists():
+        return await offload.run_cpu(
+            _build_image_content,
+            image_path,
+            fidelity,
+            size=Path(image_path).stat().st_size,
+        )
+    return [{"type": "image_url", "image_url": {"url": image_path}}]
 
-    Args:
-        image_path: Path or URL to the image to evaluate.
-        prompt: The prompt used to generate the image.
+
+async def _first_pass_evaluation(
+    client: AsyncOpenAI, image_path: str, prompt: str, policy: CascadePolicy, hedge: bool
+) -> dict | None:
+    """Score an image with the cheap first-pass model, or return None on failure."""
+    image_content = await _image_content(image_path, policy.fidelity)
+    started = time.perf_counter()
+    try:
+        response = await hedging.run(
+            "evaluate_first_pass",
+            lambda: client.chat.completions.create(
+                model=policy.model,
+                messages=[
+                    {"role": "system", "content": FIRST_PASS_SYSTEM_PROMPT},
+                    {
+                        "role": "user",
+                        "content": [{"type": "text", "text": prompt}, *image_content],
+                    },
+                ],
+                temperature=0,
+                response_format={"type": "json_object"},
+            ),
+            enabled=hedge,
+        )
+        evaluation = _parse_json_response(response.choices[0].message.content or "")
+    except Exception as e:
+        metrics.record_call("evaluate_first_pass", started, success=False)
+        print(f"Warning: First-pass image evaluation failed: {e}", file=sys.stderr)
+        return None
+    metrics.record_call("evaluate_first_pass", started, success=True)
+    return evaluation
+
+
+def _record_agreement(policy: CascadePolicy, first_score: float, full_score: float) -> None:
+    """Record how closely a first-pass score matched the full evaluation."""
+    agree = (first_score >= policy.threshold) == (full_score >= policy.threshold)
+    metrics.EVALUATION_CASCADE_AGREEMENT.labels(agree=str(agree).lower()).inc()
+    metrics.EVALUATION_CASCADE_SCORE_DIFFERENCE.labels().observe(abs(full_score - first_score))
+
+
+async def _full_evaluation(
+    client: AsyncOpenAI, image_path: str, prompt: str, fidelity: str, hedge: bool
+) -> tuple[dict, bool]:
+    """Run the full GPT-4o evaluation.
 
     Returns:
-        Dict containing `score` and `feedback` keys.
+        The evaluation and whether the API returned a usable verdict; failures yield a
+        zero score with the error in the feedback.
     """
-    client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-    if Path(image_path).exists():
-        file_bytes = await asyncio.to_thread(Path(image_path).read_bytes)
-        b64_data = base64.b64encode(file_bytes).decode()
-        image_url = f"data:image/png;base64,{b64_data}"
-    else:
-        image_url = image_path
+    image_content = await _image_content(image_path, fidelity)
 
+    started = time.perf_counter()
+    response = None
     try:
-        response = await client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {"type": "image_url", "image_url": {"url": image_url}},
-                    ],
-                },
-            ],
-            temperature=0,
-            response_format={"type": "json_object"},
+        response = await hedging.run(
+            "evaluate",
+            lambda: client.chat.completions.create(
+                model="gpt-4o",
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {
+                        "role": "user",
+                        "content": [{"type": "text", "text": prompt}, *image_content],
+                    },
+                ],
+                temperature=0,
+                response_format={"type": "json_object"},
+            ),
+            enabled=hedge,
         )
         
         content = response.choices[0].message.content or ""
         
         if not content.strip():
             print(f"Warning: Received empty response from OpenAI API for evaluation. Response: {response}", file=sys.stderr)
+            metrics.record_call("evaluate", started, success=False)
             # Return a default response instead of crashing
             return {
                 "score": 0,
                 "feedback": "Error: Unable to evaluate image due to empty API response."
-            }
-        
-        return _parse_json_response(content)
+            }, False
         
+        evaluation = _parse_json_response(content)
+        metrics.record_call("evaluate", started, success=True)
+        if isinstance(evaluation.get("score"), (int, float)):
+            metrics.EVALUATION_SCORES.labels().observe(evaluation["score"])
+        return evaluation, True
+
     except Exception as e:
+        metrics.record_call("evaluate", started, success=False)
         print(f"Error during image evaluation: {e}", file=sys.stderr)
-        print(f"Response details: {getattr(response, 'model_dump', lambda: 'No response details available')()}", file=sys.stderr)
+        if response is not None:
+            print(f"Response details: {getattr(response, 'model_dump', lambda: 'No response details available')()}", file=sys.stderr)
         # Return a default response instead of crashing
         return {
             "score": 0,
             "feedback": f"Error: Unable to evaluate image due to API error: {str(e)}"
+        }, False
+
+
+async def evaluate_image(
+    image_path: str,
+    prompt: str,
+    fidelity: str = DEFAULT_FIDELITY,
+    hedge: bool = False,
+    cascade: CascadePolicy | None = None,
+) -> dict:
+    """Evaluate an image against a prompt using OpenAI's vision model.
+
+    Args:
+        image_path: Path or URL to the image to evaluate.
+        prompt: The prompt used to generate the image.
+        fidelity: Evaluation fidelity tier, one of ``FIDELITY_TIERS``. Reduced tiers
+            only apply to local files; URLs are always sent as-is.
+        hedge: Whether to launch a duplicate request if the call is slower than the
+            observed tail latency (see ``hedging.py``).
+        cascade: Optional first-pass policy. The image is scored by the cheaper
+            ``cascade.model`` first and only escalated to the full evaluation when
+            the policy does not trust that score.
+
+    Returns:
+        Dict containing `score` and `feedback` keys. With ``cascade``, a `cascade`
+        key records the first-pass score and confidence and whether it escalated.
+    """
+    client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+    if cascade is None:
+        evaluation, _ = await _full_evaluation(client, image_path, prompt, fidelity, hedge)
+        return evaluation
+
+    first_pass = await _first_pass_evaluation(client, image_path, prompt, cascade, hedge)
+    reason = cascade.escalation_reason(first_pass)
+    if reason is None and random.random() < cascade.audit_fraction:
+        reason = "audit"
+    details = {
+        "first_pass_score": (first_pass or {}).get("score"),
+        "first_pass_confidence": (first_pass or {}).get("confidence"),
+        "escalated": reason is not None,
+        "reason": reason or "trusted",
+    }
+    metrics.EVALUATION_CASCADE_DECISIONS.labels(reason=details["reason"]).inc()
+
+    if reason is None:
+        assert first_pass is not None
+        metrics.EVALUATION_SCORES.labels().observe(first_pass["score"])
+        return {
+            "score": first_pass["score"],
+            "feedback": first_pass.get("feedback", ""),
+            "cascade": details,
         }
+
+    evaluation, ok = await _full_evaluation(client, image_path, prompt, fidelity, hedge)
+    if ok and reason != "error" and isinstance(evaluation.get("score"), (int, float)):
+        _record_agreement(cascade, first_pass["score"], evaluation["score"])
+    return {**evaluation, "cascade": details}
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Any
+
+from . import image_gen, image_hash, metrics, offload
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+KEY_VERSION = 1
+
+
+def compute_key(
+    prompt: str,
+    reference_images: list[str] | None,
+    params: dict[str, Any],
+) -> str:
+    """Hash the prompt, reference contents and generation parameters into a cache key."""
+    payload = {
+        "version": KEY_VERSION,
+        "prompt": prompt,
+        "references": [image_hash.reference_fingerprint(src) for src in reference_images or []],
+        "params": params,
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class GenerationCache:
+    """On-disk, size-bounded LRU cache of generated images keyed by content hash.
+
+    Each entry is an image file plus a JSON sidecar holding the response ID. Entry
+    recency is the sidecar's modification time, refreshed on every hit.
+    """
+
+    def __init__(self, directory: str | Path, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _meta_path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> dict[str, str | None] | None:
+        """Return a copy of the cached image and its response ID, or None on a miss."""
+        meta_path = self._meta_path(key)
+        try:
+            meta = json.loads(meta_path.read_text())
+            cached_image = self.directory / meta["image_file"]
+            output = Path(tempfile.gettempdir()) / f"generated_image_{uuid.uuid4()}{cached_image.suffix}"
+            shutil.copyfile(cached_image, output)
+            os.utime(meta_path)
+        except (OSError, ValueError, KeyError):
+            return None
+        return {"image_path": str(output), "response_id": meta.get("response_id")}
+
+    def put(self, key: str, image_path: str, response_id: str | None) -> None:
+        """Store a generated image, then evict least recently used entries over the size cap."""
+        suffix = Path(image_path).suffix
+        image_file = f"{key}{suffix}"
+        tmp_image = self.directory / f".{image_file}.{uuid.uuid4().hex}"
+        shutil.copyfile(image_path, tmp_image)
+        os.replace(tmp_image, self.directory / image_file)
+        tmp_meta = self.directory / f".{key}.json.{uuid.uuid4().hex}"
+        tmp_meta.write_text(
+            json.dumps({"image_file": image_file, "response_id": response_id, "created_at": time.time()})
+        )
+        os.replace(tmp_meta, self._meta_path(key))
+        self.evict()
+
+    def evict(self) -> None:
+        """Delete least recently used entries until the cache fits in ``max_bytes``."""
+        entries = []
+        total = 0
+        for meta_path in self.directory.glob("*.json"):
+            try:
+                meta = json.loads(meta_path.read_text())
+                image = self.directory / meta["image_file"]
+                size = image.stat().st_size + meta_path.stat().st_size
+                entries.append((meta_path.stat().st_mtime, meta_path, image, size))
+                total += size
+            except (OSError, ValueError, KeyError):
+                continue
+        for _, meta_path, image, size in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self.max_bytes:
+                break
+            meta_path.unlink(missing_ok=True)
+            image.unlink(missing_ok=True)
+            total -= size
+
+    async def generate_image(
+        self,
+        prompt: str,
+        reference_images: list[str] | None = None,
+        previous_response_id: str | None = None,
+        **kwargs: Any,
+    ) -> dict[str, str | None]:
+        """Serve ``image_gen.generate_image`` from the cache, generating and storing on a miss.
+
+        Takes the same arguments as ``image_gen.generate_image``. ``previous_response_id``
+        is part of the key; cached follow-ups chain because hits return the original
+        response ID. Request-shaping options that do not change the output (``hedge``,
+        ``use_file_ids``, ``background_mode``) are excluded from the key.
+
+        Local reference files are keyed by their contents, but URL references are keyed
+        by address only: if the image behind a URL changes, the stale cached result is
+        still served. Use local copies, or versioned URLs, for references that change.
+        """
+        params = {
+            key: value
+            for key, value in kwargs.items()
+            if key not in ("hedge", "use_file_ids", "background_mode")
+        }
+        params["previous_response_id"] = previous_response_id
+        key_sources = list(reference_images or [])
+        if kwargs.get("mask_image"):
+            key_sources.append(kwargs["mask_image"])
+            params.pop("mask_image")
+        try:
+            key = await offload.run_cpu(compute_key, prompt, key_sources, params)
+            cached = await offload.run_cpu(self.get, key)
+        except Exception as e:
+            print(f"Warning: Generation cache lookup failed: {e}", file=sys.stderr)
+            key, cached = None, None
+
+        if cached is not None:
+            metrics.GENERATION_CACHE_LOOKUPS.labels(result="hit").inc()
+            return cached
+        metrics.GENERATION_CACHE_LOOKUPS.labels(result="miss").inc()
+
+        result = await image_gen.generate_image(
+            prompt=prompt,
+            reference_images=reference_images,
+            previous_response_id=previous_response_id,
+            **kwargs,
+        )
+        if key is not None and result["image_path"]:
+            try:
+                await offload.run_cpu(self.put, key, result["image_path"], result["response_id"])
+            except Exception as e:
+                print(f"Warning: Failed to store generated image in cache: {e}", file=sys.stderr)
+        return result
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, TypeVar
+
+from . import metrics
+
+T = TypeVar("T")
+
+
+@dataclass
+class HedgePolicy:
+    """When to launch a duplicate request for a slow call.
+
+    Attributes:
+        quantile: Observed latency quantile used as the hedge delay.
+        max_hedge_fraction: Upper bound on hedged calls as a fraction of all calls.
+        min_samples: Observations needed before the quantile is trusted.
+        window: Number of recent latencies kept per stage.
+        fallback_delay: Delay used until ``min_samples`` latencies are known
+            (None disables hedging until then).
+    """
+
+    quantile: float = 0.9
+    max_hedge_fraction: float = 0.1
+    min_samples: int = 20
+    window: int = 200
+    fallback_delay: float | None = None
+
+
+class Hedger:
+    """Tracks latencies for one stage and runs calls with optional hedging."""
+
+    def __init__(self, stage: str, policy: HedgePolicy) -> None:
+        self.stage = stage
+        self.policy = policy
+        self.latencies: deque[float] = deque(maxlen=policy.window)
+        self.calls = 0
+        self.hedges = 0
+
+    def delay(self) -> float | None:
+        """Return how long to wait before hedging, or None if no estimate is available."""
+        if len(self.latencies) < self.policy.min_samples:
+            return self.policy.fallback_delay
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(self.policy.quantile * len(ordered)))
+        return ordered[index]
+
+    def _hedge_allowed(self) -> bool:
+        return self.hedges + 1 <= self.policy.max_hedge_fraction * self.calls
+
+    async def run(self, make_call: Callable[[], Awaitable[T]], enabled: bool = True) -> T:
+        """Await ``make_call()``, hedging with a second call if it is slower than ``delay()``.
+
+        The first attempt to succeed wins and the other is cancelled. If every
+        attempt fails, the first exception is raised. Latencies are recorded
+        even when hedging is disabled so the delay estimate stays warm.
+
+        The recorded latency is always timed from the primary's start. When a hedge
+        wins, the cancelled primary would have taken at least that long, so it is
+        kept as a censored sample; recording the hedge's own shorter time would drop
+        exactly the slow samples and let the delay drift down.
+
+        Args:
+            make_call: Factory returning a fresh awaitable for each attempt.
+            enabled: Whether a hedge may be launched for this call.
+
+        Returns:
+            The result of the winning attempt.
+        """
+        self.calls += 1
+        delay = self.delay() if enabled else None
+        primary = asyncio.ensure_future(make_call())
+        started = {primary: time.perf_counter()}
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done and self._hedge_allowed():
+                    self.hedges += 1
+                    hedge = asyncio.ensure_future(make_call())
+                    started[hedge] = time.perf_counter()
+
+            pending = set(started)
+            error: BaseException | None = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self.latencies.append(time.perf_counter() - started[primary])
+                        if len(started) > 1:
+                            winner = "primary" if task is primary else "hedge"
+                            metrics.HEDGED_REQUESTS.labels(stage=self.stage, winner=winner).inc()
+                        return task.result()
+                    error = error or task.exception()
+            assert error is not None
+            raise error
+        finally:
+            for task in started:
+                if not task.done():
+                    task.cancel()
+
+
+HEDGERS: dict[str, Hedger] = {
+    "generate": Hedger("generate", HedgePolicy(fallback_delay=60.0)),
+    "evaluate": Hedger("evaluate", HedgePolicy(fallback_delay=15.0)),
+    "evaluate_first_pass": Hedger("evaluate_first_pass", HedgePolicy(fallback_delay=8.0)),
+}
+
+
+async def run(stage: str, make_call: Callable[[], Awaitable[T]], enabled: bool = False) -> T:
+    """Run an API call through the hedger registered for ``stage``."""
+    return await HEDGERS[stage].run(make_call, enabled=enabled)
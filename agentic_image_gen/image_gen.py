@@ -1,17 +1,90 @@
 from __future__ import annotations
 
 import asyncio
-import base64
 import mimetypes
 import os
 import sys # Add sys import
 import tempfile
+import time
 import uuid
 from pathlib import Path
 from typing import Any # Added for type hinting
 
 import aiohttp # Added for downloading images from URLs
+import numpy as np
 from openai import AsyncOpenAI
+from PIL import Image, ImageFilter
+
+from . import contact_sheet, hedging, image_processing, metrics, offload, response_poller
+
+# Context kept around the masked region in region edits, as a fraction of its larger side.
+REGION_EDIT_PADDING = 0.25
+# Region edits fall back to a full-image edit when the padded crop exceeds this fraction.
+REGION_EDIT_MAX_AREA_FRACTION = 0.6
+# Mask alpha below this value marks a pixel for replacement.
+MASK_ALPHA_THRESHOLD = 128
+
+# Reference acquisition limits.
+REFERENCE_MAX_BYTES = 20 * 1024 * 1024
+REFERENCE_MAX_CONNECTIONS = 16
+REFERENCE_MAX_CONNECTIONS_PER_HOST = 4
+REFERENCE_DNS_CACHE_SECONDS = 300
+REFERENCE_TIMEOUT = aiohttp.ClientTimeout(total=60, sock_connect=10, sock_read=20)
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+# Secondary references needed before they are packed into a contact sheet.
+CONTACT_SHEET_MIN_REFERENCES = 2
+
+
+def _create_reference_session() -> aiohttp.ClientSession:
+    """Create the pooled HTTP session shared by all reference downloads of one request."""
+    connector = aiohttp.TCPConnector(
+        limit=REFERENCE_MAX_CONNECTIONS,
+        limit_per_host=REFERENCE_MAX_CONNECTIONS_PER_HOST,
+        ttl_dns_cache=REFERENCE_DNS_CACHE_SECONDS,
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=REFERENCE_TIMEOUT)
+
+
+_reference_session: aiohttp.ClientSession | None = None
+_reference_session_loop: asyncio.AbstractEventLoop | None = None
+
+
+def get_reference_session() -> aiohttp.ClientSession:
+    """Return the reference-download session shared by all requests on the running event loop.
+
+    Keeping one session keeps its DNS cache and keep-alive connections across
+    iterations and concurrent loops.
+    """
+    global _reference_session, _reference_session_loop
+    loop = asyncio.get_running_loop()
+    session = _reference_session
+    if session is None or session.closed or _reference_session_loop is not loop:
+        _reference_session = _create_reference_session()
+        _reference_session_loop = loop
+    return _reference_session
+
+
+async def close_reference_session() -> None:
+    """Close the shared reference session, if one is open on the running event loop."""
+    global _reference_session, _reference_session_loop
+    if _reference_session is not None and _reference_session_loop is asyncio.get_running_loop():
+        await _reference_session.close()
+    _reference_session = None
+    _reference_session_loop = None
+
+
+async def _download_limited(response: aiohttp.ClientResponse, max_bytes: int) -> bytes | None:
+    """Stream a response body, giving up once it exceeds ``max_bytes``."""
+    if response.content_length is not None and response.content_length > max_bytes:
+        return None
+    chunks: list[bytes] = []
+    received = 0
+    async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_BYTES):
+        received += len(chunk)
+        if received > max_bytes:
+            return None
+        chunks.append(chunk)
+    return b"".join(chunks)
 
 
 async def _fetch_and_encode_image(session: aiohttp.ClientSession, image_source: str) -> str | None:
@@ -24,39 +97,29 @@ async def _fetch_and_encode_image(session: aiohttp.ClientSession, image_source:
     Returns:
         A base64 data URL string if successful, or None if processing fails.
     """
+    loaded = await _read_reference_source(session, image_source)
+    if loaded is None:
+        return None
+    data, mime_type = loaded
     try:
-        if image_source.startswith(("http://", "https://")):
-            async with session.get(image_source) as response:
-                if response.status != 200:
-                    print(f"Warning: Failed to download image from URL {image_source}. Status: {response.status}", file=sys.stderr)
-                    return None
-                binary_data = await response.read()
-                mime_type = response.content_type
-                if not mime_type or not mime_type.startswith("image/"):
-                    # Fallback to guessing if content_type is not specific enough
-                    guessed_mime_type, _ = mimetypes.guess_type(image_source, strict=False)
-                    if guessed_mime_type and guessed_mime_type.startswith("image/"):
-                        mime_type = guessed_mime_type
-                    else:
-                        print(f"Warning: Could not determine a valid image MIME type for URL {image_source}. Content-Type: {mime_type}", file=sys.stderr)
-                        # Default to image/png if unable to determine, or handle error more strictly
-                        mime_type = "image/png" 
-        else:
-            image_path = Path(image_source)
-            if not image_path.is_file():
-                print(f"Warning: Reference image path not found or not a file: {image_source}", file=sys.stderr)
-                return None
-
-            mime_type, _ = mimetypes.guess_type(image_path)
-            if not mime_type or not mime_type.startswith("image/"):
+        if not mime_type or not mime_type.startswith("image/"):
+            # Fallback to guessing if content_type is not specific enough
+            guessed_mime_type, _ = mimetypes.guess_type(image_source, strict=False)
+            if guessed_mime_type and guessed_mime_type.startswith("image/"):
+                mime_type = guessed_mime_type
+            elif isinstance(data, str):
                 print(f"Warning: Could not determine a valid image MIME type for {image_source}", file=sys.stderr)
                 return None
+            else:
+                print(f"Warning: Could not determine a valid image MIME type for URL {image_source}. Content-Type: {mime_type}", file=sys.stderr)
+                # Default to image/png if unable to determine, or handle error more strictly
+                mime_type = "image/png"
 
-            with image_path.open("rb") as f:
-                binary_data = f.read()
-        
-        base64_encoded_data = base64.b64encode(binary_data).decode("utf-8")
-        return f"data:{mime_type};base64,{base64_encoded_data}"
+        if isinstance(data, str):
+            return await offload.run_cpu(
+                offload.encode_file_data_url, data, mime_type, size=Path(data).stat().st_size
+            )
+        return await offload.run_cpu(offload.encode_data_url, data, mime_type, size=len(data))
     except Exception as e:
         print(f"Error processing image source {image_source}: {e}", file=sys.stderr)
         return None
@@ -84,6 +147,122 @@ async def _create_file_from_path(client: AsyncOpenAI, file_path: str) -> str | N
         return None
 
 
+async def _prepare_reference(
+    client: AsyncOpenAI, session: aiohttp.ClientSession, image_source: str, use_file_ids: bool
+) -> dict | None:
+    """Turn one reference image into an ``input_image`` content item.
+
+    Local files are uploaded when ``use_file_ids`` is set; URLs and everything else
+    are sent as base64 data URLs.
+    """
+    is_url = image_source.startswith(("http://", "https://"))
+    if use_file_ids and not is_url:
+        file_id = await _create_file_from_path(client, image_source)
+        if file_id:
+            return {"type": "input_image", "file_id": file_id}
+        print(f"Skipping image due to upload error: {image_source}", file=sys.stderr)
+        return None
+
+    if use_file_ids:
+        print(f"Warning: Cannot upload URL as file, falling back to base64 for {image_source}", file=sys.stderr)
+    base64_data_url = await _fetch_and_encode_image(session, image_source)
+    if base64_data_url:
+        return {"type": "input_image", "image_url": base64_data_url}
+    print(f"Skipping reference image due to processing error: {image_source}", file=sys.stderr)
+    return None
+
+
+async def _prepare_references(
+    client: AsyncOpenAI, image_sources: list[str], use_file_ids: bool
+) -> list[dict]:
+    """Download, encode or upload all reference images concurrently over the shared session.
+
+    Returns:
+        ``input_image`` content items in the order of ``image_sources``, skipping failures.
+    """
+    session = get_reference_session()
+    items = await asyncio.gather(
+        *(_prepare_reference(client, session, src, use_file_ids) for src in image_sources)
+    )
+    return [item for item in items if item is not None]
+
+
+async def _read_reference_source(
+    session: aiohttp.ClientSession, image_source: str
+) -> tuple[bytes | str, str | None] | None:
+    """Download a URL reference, or validate a local one, enforcing the size cap.
+
+    Returns:
+        ``(data, mime_type)``, where ``data`` is the downloaded bytes for a URL or the
+        path for a local file, and ``mime_type`` is the response's content type or the
+        type guessed from the file name. None if the reference cannot be read.
+    """
+    try:
+        if image_source.startswith(("http://", "https://")):
+            async with session.get(image_source) as response:
+                if response.status != 200:
+                    print(f"Warning: Failed to download image from URL {image_source}. Status: {response.status}", file=sys.stderr)
+                    return None
+                binary_data = await _download_limited(response, REFERENCE_MAX_BYTES)
+                if binary_data is None:
+                    print(f"Warning: Image at URL {image_source} exceeds {REFERENCE_MAX_BYTES} bytes. Skipping.", file=sys.stderr)
+                    return None
+                return binary_data, response.content_type
+        image_path = Path(image_source)
+        if not image_path.is_file():
+            print(f"Warning: Reference image path not found or not a file: {image_source}", file=sys.stderr)
+            return None
+        if image_path.stat().st_size > REFERENCE_MAX_BYTES:
+            print(f"Warning: Reference image {image_source} exceeds {REFERENCE_MAX_BYTES} bytes. Skipping.", file=sys.stderr)
+            return None
+        mime_type, _ = mimetypes.guess_type(image_path)
+        return image_source, mime_type
+    except Exception as e:
+        print(f"Error reading image source {image_source}: {e}", file=sys.stderr)
+        return None
+
+
+async def _pack_references(image_sources: list[str]) -> tuple[str, int, bool] | None:
+    """Pack references into one labeled contact sheet, reusing a cached sheet if present.
+
+    Sheets are cached by the reference set's hash only when every reference could be
+    read, so a cached sheet always holds the whole set. The cache is pruned to
+    ``contact_sheet.MAX_CACHE_BYTES`` after each write.
+
+    Returns:
+        The sheet's path, the number of references on it and whether the sheet is a
+        temporary file the caller must delete, or None if fewer than two references
+        could be read or composing failed.
+    """
+    try:
+        key = await offload.run_cpu(contact_sheet.reference_set_key, image_sources)
+        path = contact_sheet.sheet_path(key)
+        if path.is_file():
+            os.utime(path)
+            return str(path), len(image_sources), False
+
+        session = get_reference_session()
+        loaded = await asyncio.gather(
+            *(_read_reference_source(session, src) for src in image_sources)
+        )
+        readable = [(src, item[0]) for src, item in zip(image_sources, loaded) if item is not None]
+        if len(readable) < 2:
+            return None
+        temporary = len(readable) < len(image_sources)
+        if temporary:
+            path = Path(_temp_image_path("contact_sheet", "jpeg"))
+        labels = [contact_sheet.reference_label(i, src) for i, (src, _) in enumerate(readable, start=1)]
+        await offload.run_cpu(
+            contact_sheet.write_contact_sheet, [data for _, data in readable], labels, str(path)
+        )
+        if not temporary:
+            await offload.run_cpu(contact_sheet.prune_cache)
+        return str(path), len(readable), temporary
+    except Exception as e:
+        print(f"Warning: Failed to pack references into a contact sheet: {e}", file=sys.stderr)
+        return None
+
+
 async def generate_image(
     prompt: str,
     reference_images: list[str] | None = None,
@@ -94,6 +273,9 @@ async def generate_image(
     size: str = "1024x1024",
     background: str = "transparent",
     output_format: str = "png",
+    hedge: bool = False,
+    background_mode: bool = False,
+    pack_references: bool = False,
 ) -> dict[str, str | None]:
     """Generate or edit an image using OpenAI's Image Edits API with gpt-4.1.
     Supports initial generation with text and reference images,
@@ -109,15 +291,26 @@ async def generate_image(
         size: Size hint to include in prompt (e.g., 1024x1024).
         background: Background hint to include in prompt (transparent, opaque).
         output_format: Output format hint to include in prompt (png, jpeg, webp).
+        hedge: Whether to launch a duplicate request if the call is slower than the
+            observed tail latency (see ``hedging.py``).
+        background_mode: Whether to submit the request in background mode and await
+            the result through the shared poller (see ``response_poller.py``) instead
+            of holding the request open. Hedging does not apply in this mode.
+        pack_references: Whether, on initial generation, references after the first
+            are tiled into one labeled contact sheet (see ``contact_sheet.py``) while
+            the first, primary product image is sent separately at full fidelity.
 
     Returns:
         A dictionary containing:
             "image_path": Path to the generated image (or empty string on failure).
             "response_id": The ID of the OpenAI API response (or None on failure).
+                In background mode the ID is returned even if waiting fails, so the
+                result can still be collected with ``resume_generation``.
     """
     client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
     generated_image_path = ""
     current_api_response_id: str | None = None
+    started = time.perf_counter()
 
     try:
         # Build tool parameters
@@ -143,6 +336,8 @@ async def generate_image(
         # Construct the user content list, always including the text prompt
         input_user_content_list: list[dict] = [{"type": "input_text", "text": prompt}]
         images_to_process: list[str] = []
+        packed_count = 0
+        temporary_sheet: str | None = None
 
         if previous_response_id:
             call_params["previous_response_id"] = previous_response_id
@@ -152,39 +347,41 @@ async def generate_image(
         else:
             # For initial generation, use all provided reference images
             if reference_images:
-                images_to_process.extend(reference_images)
+                images_to_process.append(reference_images[0])
+                secondary = reference_images[1:]
+                packed = None
+                if pack_references and len(secondary) >= CONTACT_SHEET_MIN_REFERENCES:
+                    packed = await _pack_references(secondary)
+                if packed:
+                    sheet, packed_count, temporary = packed
+                    images_to_process.append(sheet)
+                    if temporary:
+                        temporary_sheet = sheet
+                else:
+                    images_to_process.extend(secondary)
 
         # Add mask image as the first image if provided (for inpainting)
         if mask_image:
             images_to_process.insert(0, mask_image)
 
         if images_to_process:
-            if use_file_ids:
-                # Upload images as files and use file IDs
-                for img_path in images_to_process:
-                    if img_path.startswith(("http://", "https://")):
-                        print(f"Warning: Cannot upload URL as file, falling back to base64 for {img_path}", file=sys.stderr)
-                        # Fallback to base64 for URLs
-                        async with aiohttp.ClientSession() as session:
-                            base64_data_url = await _fetch_and_encode_image(session, img_path)
-                            if base64_data_url:
-                                input_user_content_list.append({"type": "input_image", "image_url": base64_data_url})
-                    else:
-                        file_id = await _create_file_from_path(client, img_path)
-                        if file_id:
-                            input_user_content_list.append({"type": "input_image", "file_id": file_id})
-                        else:
-                            print(f"Skipping image due to upload error: {img_path}", file=sys.stderr)
-            else:
-                # Use base64 encoding
-                async with aiohttp.ClientSession() as session:
-                    tasks = [_fetch_and_encode_image(session, img_src) for img_src in images_to_process]
-                    encoded_images = await asyncio.gather(*tasks)
-                    for img_src, base64_data_url in zip(images_to_process, encoded_images):
-                        if base64_data_url:
-                            input_user_content_list.append({"type": "input_image", "image_url": base64_data_url})
-                        else:
-                            print(f"Skipping reference image due to processing error: {img_src}", file=sys.stderr)
+            try:
+                input_user_content_list.extend(
+                    await _prepare_references(client, images_to_process, use_file_ids)
+                )
+            finally:
+                # A sheet of a partial reference set is not cached; it is only needed
+                # until it has been encoded or uploaded.
+                if temporary_sheet:
+                    Path(temporary_sheet).unlink(missing_ok=True)
+        if packed_count:
+            input_user_content_list.append({
+                "type": "input_text",
+                "text": (
+                    f"The last image is a contact sheet of {packed_count} additional reference "
+                    f"views of the same product, labeled 1 to {packed_count}."
+                ),
+            })
 
         # Check for valid input before making API call
         is_prompt_empty = not prompt.strip()
@@ -196,41 +393,188 @@ async def generate_image(
 
         call_params["input"] = [{"role": "user", "content": input_user_content_list}]
         
-        response = await client.responses.create(**call_params)
-        current_api_response_id = response.id
-        
-        # Extract image data from response
-        image_generation_calls = [
-            output
-            for output in response.output
-            if hasattr(output, 'type') and output.type == "image_generation_call"
-        ]
-        
-        image_data = [output.result for output in image_generation_calls if hasattr(output, 'result') and output.result]
-        
-        if image_data:
-            image_base64_data = image_data[0]
-            # Remove data URL prefix if present
-            if ',' in image_base64_data:
-                image_base64_data = image_base64_data.split(',', 1)[1]
-            
-            image_bytes = base64.b64decode(image_base64_data)
-            temp_dir = tempfile.gettempdir()
-            file_name = f"generated_image_{uuid.uuid4()}.{output_format}"
-            generated_image_path = str(Path(temp_dir) / file_name)
-            with open(generated_image_path, "wb") as f:
-                f.write(image_bytes)
+        if background_mode:
+            call_params["background"] = True
+            submitted = await client.responses.create(**call_params)
+            current_api_response_id = submitted.id
+            response = await response_poller.get_poller().wait(submitted.id)
         else:
-            print("No image data found in the API response.", file=sys.stderr)
-            if response.output and hasattr(response.output[0], 'content'):
-                print(f"API response output content: {response.output[0].content}", file=sys.stderr)
+            response = await hedging.run(
+                "generate", lambda: client.responses.create(**call_params), enabled=hedge
+            )
+            current_api_response_id = response.id
+
+        generated_image_path = await _save_response_image(response, output_format)
 
     except Exception as e:
         print(f"Error during image generation with Image Edits API: {e}", file=sys.stderr)
-    
+        if background_mode and current_api_response_id:
+            print(
+                f"Background response {current_api_response_id} may still complete; "
+                "collect it with resume_generation().",
+                file=sys.stderr,
+            )
+
+    metrics.record_call("generate", started, success=bool(generated_image_path))
     return {"image_path": generated_image_path, "response_id": current_api_response_id}
 
 
+async def _save_response_image(response: Any, output_format: str) -> str:
+    """Decode the first generated image of a response to a temporary file.
+
+    Returns:
+        The image path, or an empty string if the response holds no image.
+    """
+    status = getattr(response, "status", None)
+    if status is not None and status != "completed":
+        print(f"Warning: Response {response.id} finished with status {status}.", file=sys.stderr)
+
+    # Extract image data from response
+    image_generation_calls = [
+        output
+        for output in response.output or []
+        if hasattr(output, 'type') and output.type == "image_generation_call"
+    ]
+
+    image_data = [output.result for output in image_generation_calls if hasattr(output, 'result') and output.result]
+
+    if not image_data:
+        print("No image data found in the API response.", file=sys.stderr)
+        if response.output and hasattr(response.output[0], 'content'):
+            print(f"API response output content: {response.output[0].content}", file=sys.stderr)
+        return ""
+
+    image_base64_data = image_data[0]
+    # Remove data URL prefix if present
+    if ',' in image_base64_data:
+        image_base64_data = image_base64_data.split(',', 1)[1]
+
+    temp_dir = tempfile.gettempdir()
+    file_name = f"generated_image_{uuid.uuid4()}.{output_format}"
+    image_file_path = str(Path(temp_dir) / file_name)
+    await offload.run_cpu(
+        offload.decode_to_file,
+        image_base64_data,
+        image_file_path,
+        size=len(image_base64_data),
+    )
+    return image_file_path
+
+
+async def resume_generation(
+    response_id: str,
+    output_format: str = "png",
+    timeout: float | None = response_poller.DEFAULT_WAIT_TIMEOUT,
+) -> dict[str, str | None]:
+    """Collect the result of a background-mode generation by its response ID.
+
+    Works across reconnects and process restarts, since background responses are
+    stored server-side until retrieved.
+
+    Args:
+        response_id: ID returned by a ``background_mode`` call to ``generate_image``.
+        output_format: Extension for the saved image (png, jpeg, webp).
+        timeout: Seconds to wait for a still-running generation (None waits indefinitely).
+
+    Returns:
+        The same dictionary as ``generate_image``.
+    """
+    image_path = ""
+    try:
+        response = await response_poller.get_poller().wait(response_id, timeout=timeout)
+        image_path = await _save_response_image(response, output_format)
+    except Exception as e:
+        print(f"Error resuming background generation {response_id}: {e}", file=sys.stderr)
+    return {"image_path": image_path, "response_id": response_id}
+
+
+def _temp_image_path(prefix: str, output_format: str) -> str:
+    return str(Path(tempfile.gettempdir()) / f"{prefix}_{uuid.uuid4()}.{output_format}")
+
+
+def _load_edit_mask(mask_path: str, size: tuple[int, int]) -> Image.Image:
+    """Load a mask as RGBA, resized to the image size if needed."""
+    with Image.open(mask_path) as mask:
+        rgba = mask.convert("RGBA")
+    if rgba.size != size:
+        rgba = rgba.resize(size, Image.Resampling.NEAREST)
+    return rgba
+
+
+def _closest_generation_size(width: int, height: int) -> str:
+    """Pick the supported generation size whose aspect ratio best fits a crop."""
+    ratio = width / height
+    if ratio >= 1.25:
+        return "1536x1024"
+    if ratio <= 0.8:
+        return "1024x1536"
+    return "1024x1024"
+
+
+def _generation_aspect(size: str) -> float:
+    width, height = (int(value) for value in size.split("x"))
+    return width / height
+
+
+def _crop_for_region_edit(
+    image_path: str, mask_path: str, padding: float
+) -> tuple[str, str, tuple[int, int, int, int], str] | None:
+    """Write a padded crop of the image and mask around the masked region.
+
+    The padded box is grown to the aspect ratio of the generation size it will be
+    edited at, so the edited crop scales back into the box without distortion.
+
+    Returns:
+        ``(crop_path, mask_crop_path, box, generation_size)``, or None if the mask has
+        no transparent region or the padded crop would cover most of the image.
+    """
+    with Image.open(image_path) as img:
+        img.load()
+        mask = _load_edit_mask(mask_path, img.size)
+        edit_area = np.asarray(mask)[:, :, 3] < MASK_ALPHA_THRESHOLD
+        box = image_processing.mask_bounding_box(edit_area)
+        if box is None:
+            return None
+        box = image_processing.pad_box(box, img.size, padding)
+        generation_size = _closest_generation_size(box[2] - box[0], box[3] - box[1])
+        box = image_processing.fit_box_to_aspect(
+            box, img.size, _generation_aspect(generation_size)
+        )
+        left, top, right, bottom = box
+        if (right - left) * (bottom - top) > REGION_EDIT_MAX_AREA_FRACTION * img.width * img.height:
+            return None
+        crop_path = _temp_image_path("region_crop", "png")
+        mask_crop_path = _temp_image_path("region_mask", "png")
+        img.crop(box).save(crop_path, "PNG")
+        mask.crop(box).save(mask_crop_path, "PNG")
+    return crop_path, mask_crop_path, box, generation_size
+
+
+def _composite_region_edit(
+    image_path: str,
+    mask_path: str,
+    edited_crop_path: str,
+    box: tuple[int, int, int, int],
+    output_path: str,
+    output_format: str,
+) -> None:
+    """Paste the masked part of an edited crop back into the full-resolution original."""
+    with Image.open(image_path) as original, Image.open(edited_crop_path) as edited:
+        result = original.convert("RGBA")
+        left, top, right, bottom = box
+        edited_region = edited.convert("RGBA").resize(
+            (right - left, bottom - top), Image.Resampling.LANCZOS
+        )
+    mask = _load_edit_mask(mask_path, result.size).crop(box)
+    edit_alpha = Image.fromarray(
+        ((np.asarray(mask)[:, :, 3] < MASK_ALPHA_THRESHOLD) * 255).astype(np.uint8), mode="L"
+    ).filter(ImageFilter.GaussianBlur(2))
+    result.paste(edited_region, (left, top), mask=edit_alpha)
+    if output_format == "jpeg":
+        result = image_processing.flatten_onto_background(result)
+    result.save(output_path, format=output_format.upper())
+
+
 # Convenience function for image editing/inpainting
 async def edit_image(
     prompt: str,
@@ -238,6 +582,8 @@ async def edit_image(
     mask_path: str,
     use_file_ids: bool = False,
     output_format: str = "png",
+    region_only: bool = False,
+    region_padding: float = REGION_EDIT_PADDING,
 ) -> dict[str, str | None]:
     """Edit an image using a mask (inpainting).
     
@@ -247,14 +593,61 @@ async def edit_image(
         mask_path: Path to the mask image (transparent areas will be replaced).
         use_file_ids: Whether to upload images as files instead of base64 encoding.
         output_format: Output format (png, jpeg, webp).
+        region_only: Send only a padded crop around the masked region and composite the
+            result back into the original at full resolution. Falls back to a full-image
+            edit when the masked region covers most of the image.
+        region_padding: Context kept around the masked region, as a fraction of its larger side.
         
     Returns:
         A dictionary containing the image path and response ID.
     """
-    return await generate_image(
-        prompt=prompt,
-        reference_images=[image_path],
-        mask_image=mask_path,
-        use_file_ids=use_file_ids,
-        output_format=output_format
-    )
+    region = None
+    if region_only:
+        try:
+            region = await offload.run_cpu(_crop_for_region_edit, image_path, mask_path, region_padding)
+        except Exception as e:
+            print(f"Warning: Could not crop {image_path} for a region edit: {e}", file=sys.stderr)
+
+    if region is None:
+        return await generate_image(
+            prompt=prompt,
+            reference_images=[image_path],
+            mask_image=mask_path,
+            use_file_ids=use_file_ids,
+            output_format=output_format
+        )
+
+    crop_path, mask_crop_path, box, generation_size = region
+    try:
+        result = await generate_image(
+            prompt=prompt,
+            reference_images=[crop_path],
+            mask_image=mask_crop_path,
+            use_file_ids=use_file_ids,
+            size=generation_size,
+            output_format="png",
+        )
+    finally:
+        for path in (crop_path, mask_crop_path):
+            Path(path).unlink(missing_ok=True)
+    if not result["image_path"]:
+        return result
+
+    output_path = _temp_image_path("edited_image", output_format)
+    try:
+        await offload.run_cpu(
+            _composite_region_edit,
+            image_path,
+            mask_path,
+            result["image_path"],
+            box,
+            output_path,
+            output_format,
+        )
+    except Exception as e:
+        print(f"Error compositing region edit for {image_path}: {e}", file=sys.stderr)
+        return {"image_path": "", "response_id": result["response_id"]}
+    finally:
+        # The edited crop only matters until it has been composited.
+        Path(result["image_path"]).unlink(missing_ok=True)
+    return {"image_path": output_path, "response_id": result["response_id"]}
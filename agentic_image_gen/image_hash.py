@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import hashlib
+import sys
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+from PIL import Image
+
+# 16x16 grid, 256-bit hashes: fine enough that small product details move several bits.
+HASH_SIZE = 16
+# Side length of the downscaled RGB images compared to confirm a hash match.
+PIXEL_CHECK_SIZE = 64
+PIXEL_CHECK_BLOCK = 8
+
+
+def _load_small(image_path: str, width: int, height: int, mode: str = "L") -> np.ndarray:
+    """Load an image as a small array in ``mode``, flattening any transparency onto white."""
+    with Image.open(image_path) as img:
+        if img.mode in ("RGBA", "LA", "P"):
+            rgba = img.convert("RGBA")
+            flattened = Image.new("RGBA", rgba.size, (255, 255, 255, 255))
+            flattened.alpha_composite(rgba)
+            img = flattened
+        small = img.convert(mode).resize((width, height), Image.Resampling.LANCZOS)
+    return np.asarray(small, dtype=np.int16)
+
+
+def compute_dhash(image_path: str, hash_size: int = HASH_SIZE) -> int | None:
+    """Compute the difference hash (dHash) of an image.
+
+    Args:
+        image_path: Path to the image file.
+        hash_size: Side length of the hash grid; the hash has ``hash_size ** 2`` bits.
+
+    Returns:
+        The hash as an integer, or None if the image could not be read.
+    """
+    try:
+        pixels = _load_small(image_path, hash_size + 1, hash_size)
+    except Exception as e:
+        print(f"Warning: Could not compute perceptual hash for {image_path}: {e}", file=sys.stderr)
+        return None
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def pixel_difference(
+    first_path: str, second_path: str, size: int = PIXEL_CHECK_SIZE, block: int = PIXEL_CHECK_BLOCK
+) -> float | None:
+    """Compare two images downscaled to ``size`` pixels square, block by block.
+
+    Used to confirm a hash match. The result is the largest mean absolute RGB
+    difference over any ``block`` x ``block`` region, so a small but real change (a
+    recoloured stone, a missing prong) stands out instead of averaging away.
+
+    Returns:
+        The difference on a 0-255 scale, or None if either image could not be read.
+    """
+    try:
+        first = _load_small(first_path, size, size, mode="RGB")
+        second = _load_small(second_path, size, size, mode="RGB")
+    except Exception as e:
+        print(f"Warning: Could not compare {first_path} and {second_path}: {e}", file=sys.stderr)
+        return None
+    blocks = size // block
+    difference = np.abs(first - second).mean(axis=2)[: blocks * block, : blocks * block]
+    return float(difference.reshape(blocks, block, blocks, block).mean(axis=(1, 3)).max())
+
+
+def hamming_distance(first: int, second: int) -> int:
+    """Return the number of differing bits between two hashes."""
+    return bin(first ^ second).count("1")
+
+
+def find_near_duplicate(
+    image_hash: int | None, known_hashes: Sequence[int | None], max_distance: int
+) -> int | None:
+    """Find the closest previously seen hash within ``max_distance`` bits.
+
+    Args:
+        image_hash: Hash of the candidate image.
+        known_hashes: Hashes of already scored images (None entries are ignored).
+        max_distance: Maximum Hamming distance for two images to count as duplicates.
+
+    Returns:
+        Index into ``known_hashes`` of the closest match, or None if there is none.
+    """
+    if image_hash is None:
+        return None
+    best_index: int | None = None
+    best_distance = max_distance + 1
+    for index, known in enumerate(known_hashes):
+        if known is None:
+            continue
+        distance = hamming_distance(image_hash, known)
+        if distance < best_distance:
+            best_index = index
+            best_distance = distance
+    return best_index
+
+
+def file_sha256(path: str) -> str:
+    """Return the hex SHA-256 digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def reference_fingerprint(source: str) -> str:
+    """Identify a reference image by content for local files, by address for URLs."""
+    if source.startswith(("http://", "https://")) or not Path(source).is_file():
+        return f"url:{source}"
+    return f"sha256:{file_sha256(source)}"
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import base64
+import io
+
+import numpy as np
+from PIL import Image
+
+# Channel difference from the estimated background above which a pixel counts as product.
+SALIENCY_THRESHOLD = 24
+# Alpha value above which a pixel counts as product in transparent images.
+ALPHA_THRESHOLD = 16
+
+
+def has_transparency(img: Image.Image) -> bool:
+    """Return True if the image carries an alpha channel with any non-opaque pixel."""
+    if img.mode not in ("RGBA", "LA", "PA") and "transparency" not in img.info:
+        return False
+    alpha = np.asarray(img.convert("RGBA"))[:, :, 3]
+    return bool((alpha < 255).any())
+
+
+def flatten_onto_background(img: Image.Image, color: tuple[int, int, int] = (255, 255, 255)) -> Image.Image:
+    """Composite an image onto a solid background colour and return an RGB image."""
+    rgba = img.convert("RGBA")
+    background = Image.new("RGBA", rgba.size, (*color, 255))
+    background.alpha_composite(rgba)
+    return background.convert("RGB")
+
+
+def _foreground_mask(img: Image.Image) -> np.ndarray:
+    """Boolean mask of product pixels, from alpha when present, else from border contrast."""
+    if has_transparency(img):
+        return np.asarray(img.convert("RGBA"))[:, :, 3] > ALPHA_THRESHOLD
+
+    pixels = np.asarray(img.convert("RGB"), dtype=np.int16)
+    border = np.concatenate(
+        [pixels[0, :], pixels[-1, :], pixels[:, 0], pixels[:, -1]], axis=0
+    )
+    background = np.median(border, axis=0)
+    return (np.abs(pixels - background).max(axis=2)) > SALIENCY_THRESHOLD
+
+
+def mask_bounding_box(mask: np.ndarray) -> tuple[int, int, int, int] | None:
+    """Return the ``(left, top, right, bottom)`` box around True pixels, or None if empty."""
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    if rows.size == 0 or cols.size == 0:
+        return None
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+def pad_box(
+    box: tuple[int, int, int, int], size: tuple[int, int], padding: float
+) -> tuple[int, int, int, int]:
+    """Grow a box by ``padding`` times its larger side on each edge, clamped to ``size``."""
+    left, top, right, bottom = box
+    margin = int(round(max(right - left, bottom - top) * padding))
+    width, height = size
+    return (
+        max(0, left - margin),
+        max(0, top - margin),
+        min(width, right + margin),
+        min(height, bottom + margin),
+    )
+
+
+def fit_box_to_aspect(
+    box: tuple[int, int, int, int], size: tuple[int, int], aspect: float
+) -> tuple[int, int, int, int]:
+    """Grow a box around its centre to the ``aspect`` (width / height) ratio.
+
+    The grown box is shifted to stay inside ``size`` and only clamped when the image
+    itself is too small in that dimension.
+    """
+    left, top, right, bottom = box
+    width, height = right - left, bottom - top
+    if width / height < aspect:
+        width = round(height * aspect)
+    else:
+        height = round(width / aspect)
+
+    def _span(start: int, end: int, length: int, limit: int) -> tuple[int, int]:
+        length = min(length, limit)
+        low = (start + end - length) // 2
+        low = min(max(low, 0), limit - length)
+        return low, low + length
+
+    new_left, new_right = _span(left, right, width, size[0])
+    new_top, new_bottom = _span(top, bottom, height, size[1])
+    return new_left, new_top, new_right, new_bottom
+
+
+def product_bounding_box(img: Image.Image, padding: float = 0.05) -> tuple[int, int, int, int] | None:
+    """Locate the product region of an image.
+
+    Uses the alpha channel for transparent images and contrast against the
+    border colour otherwise.
+
+    Args:
+        img: The image to inspect.
+        padding: Extra margin around the detected region, as a fraction of its larger side.
+
+    Returns:
+        The padded ``(left, top, right, bottom)`` box, or None if no product was found.
+    """
+    box = mask_bounding_box(_foreground_mask(img))
+    if box is None:
+        return None
+    return pad_box(box, img.size, padding)
+
+
+def to_data_url(img: Image.Image, image_format: str = "PNG", **save_kwargs) -> str:
+    """Encode an image as a base64 data URL."""
+    buffer = io.BytesIO()
+    img.save(buffer, format=image_format, **save_kwargs)
+    encoded = base64.b64encode(buffer.getvalue()).decode("utf-8")
+    return f"data:image/{image_format.lower()};base64,{encoded}"
+
+
+def downscale(img: Image.Image, max_side: int) -> Image.Image:
+    """Return a copy of the image whose longer side is at most ``max_side`` pixels."""
+    copy = img.copy()
+    copy.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    return copy
@@ -1,19 +1,34 @@
 from __future__ import annotations
 
 import sys
-from typing import List
+import time
+from typing import AsyncIterator, List
 
 from . import (
     assistant_manager,
+    context_window,
+    derivatives as derivatives_module,
     evaluator,
+    generation_cache,
     image_gen,
+    image_hash,
+    loop_events,
+    metrics,
+    offload,
+    prompt_index,
     prompter,
+    run_archive,
     run_orchestrator,
     thread_manager,
 )
 
 MAX_ITERATIONS = 1
 SCORE_THRESHOLD = 95
+# Maximum dHash Hamming distance (out of 64 bits) for two images to count as the same image.
+# Hamming distance (of image_hash.HASH_SIZE ** 2 bits) within which an image may be a duplicate.
+DUPLICATE_HASH_DISTANCE = 8
+# Largest per-block RGB difference (image_hash.pixel_difference) that confirms a hash match.
+DUPLICATE_PIXEL_DIFFERENCE = 8.0
 
 
 async def run_image_generation_loop(
@@ -22,7 +37,19 @@ async def run_image_generation_loop(
     quality: str,
     size: str,
     background: str,
-    output_format: str
+    output_format: str,
+    evaluation_fidelity: str = evaluator.DEFAULT_FIDELITY,
+    evaluation_cascade: evaluator.CascadePolicy | None = None,
+    hedge_requests: bool = False,
+    background_mode: bool = False,
+    pack_references: bool = False,
+    derivatives: list[derivatives_module.DerivativeSpec] | None = None,
+    context_token_budget: int = context_window.DEFAULT_TOKEN_BUDGET,
+    prompt_index_path: str | None = None,
+    archive_path: str | None = None,
+    category: str | None = None,
+    cache_dir: str | None = None,
+    cache_max_bytes: int = generation_cache.DEFAULT_MAX_BYTES,
 ) -> dict:
     """Run the iterative prompt→image→evaluate loop.
 
@@ -33,79 +60,349 @@ async def run_image_generation_loop(
         size: Dimensions of the generated image (e.g., 1024x1024).
         background: Background of the generated image (opaque, transparent, auto).
         output_format: Output format (png, jpeg, webp).
+        evaluation_fidelity: Image fidelity tier sent to the evaluator (full, low, low_crop).
+        evaluation_cascade: Optional first-pass policy; images are scored by a cheaper
+            model first and escalate to the full evaluation only near the threshold
+            or when the first pass is uncertain.
+        hedge_requests: Whether generation and evaluation calls may be hedged with a
+            duplicate request when they exceed the observed tail latency.
+        background_mode: Whether generations are submitted in background mode and
+            awaited through the shared response poller instead of open requests.
+        pack_references: Whether reference images after the first are packed into one
+            labeled contact sheet on the initial generation.
+        derivatives: Renditions to derive locally from the best image once the loop ends.
+            Their paths are returned under ``"derivatives"``, keyed by spec name.
+        context_token_budget: Approximate token budget for the summary of earlier
+            iterations given to the prompter.
+        prompt_index_path: Optional JSON-lines file of past run outcomes. When set, the
+            initial prompt is extended with refinements from similar past winning runs,
+            and this run's best prompt and score are appended to it.
+        archive_path: Optional SQLite run archive; when set, the run and every iteration
+            (prompts, image hashes, scores, feedback, response IDs, timings, parameters)
+            are stored there once the loop ends.
+        category: Optional product category recorded with the run in the archive.
+        cache_dir: Optional directory for the content-addressed generation cache. Replays
+            with identical prompts, references and parameters are served from disk.
+        cache_max_bytes: Size cap of the generation cache before LRU eviction.
 
     Returns:
         A dictionary containing the best image, final score and full history.
     """
+    result: dict = {}
+    async for event in iterate_image_generation_loop(
+        prompt,
+        reference_images,
+        quality,
+        size,
+        background,
+        output_format,
+        evaluation_fidelity=evaluation_fidelity,
+        evaluation_cascade=evaluation_cascade,
+        hedge_requests=hedge_requests,
+        background_mode=background_mode,
+        pack_references=pack_references,
+        derivatives=derivatives,
+        context_token_budget=context_token_budget,
+        prompt_index_path=prompt_index_path,
+        archive_path=archive_path,
+        category=category,
+        cache_dir=cache_dir,
+        cache_max_bytes=cache_max_bytes,
+    ):
+        if isinstance(event, loop_events.LoopFinished):
+            result = event.result
+    return result
+
+
+async def iterate_image_generation_loop(
+    prompt: str,
+    reference_images: list[str] | None,
+    quality: str,
+    size: str,
+    background: str,
+    output_format: str,
+    evaluation_fidelity: str = evaluator.DEFAULT_FIDELITY,
+    evaluation_cascade: evaluator.CascadePolicy | None = None,
+    hedge_requests: bool = False,
+    background_mode: bool = False,
+    pack_references: bool = False,
+    derivatives: list[derivatives_module.DerivativeSpec] | None = None,
+    context_token_budget: int = context_window.DEFAULT_TOKEN_BUDGET,
+    prompt_index_path: str | None = None,
+    archive_path: str | None = None,
+    category: str | None = None,
+    cache_dir: str | None = None,
+    cache_max_bytes: int = generation_cache.DEFAULT_MAX_BYTES,
+) -> AsyncIterator[loop_events.LoopEvent]:
+    """Run the loop as an async generator, yielding an event after each stage.
+
+    Takes the same arguments as ``run_image_generation_loop``. The last event is
+    ``LoopFinished``, carrying the same dictionary that function returns.
+    Closing the generator (``aclose()`` or leaving an ``async for`` early) or
+    cancelling the consuming task stops the loop before any further API call.
+    """
     thread_id = await thread_manager.create_thread()
     assistant_id = assistant_manager.load_assistant_id()
     if assistant_id is None:
         assistant_id = await assistant_manager.create_assistant()
 
+    started_at = time.time()
     full_history: List[dict] = []
+    # Archive-only details (hash, response ID, timings), aligned with full_history.
+    iteration_details: List[dict] = []
 
     best_score = -1
     best_image_url = ""
+    best_prompt = prompt
     current_prompt = prompt
+    if prompt_index_path:
+        current_prompt = await offload.run_cpu(
+            prompt_index.warm_start_prompt, prompt, prompt_index_path
+        )
     current_openai_response_id: str | None = None
+    # Perceptual hashes of evaluated images and the history index each one was scored at.
+    scored_hashes: List[int | None] = []
+    scored_indices: List[int] = []
+    context = context_window.ContextWindow(context_token_budget)
+    generate_image = image_gen.generate_image
+    if cache_dir:
+        generate_image = generation_cache.GenerationCache(cache_dir, cache_max_bytes).generate_image
 
     for i in range(MAX_ITERATIONS):
         
         iteration_prompt = current_prompt
+        iteration = i + 1
 
-        gen_result = await image_gen.generate_image(
+        yield loop_events.GenerationStarted(iteration=iteration, prompt=iteration_prompt)
+        generation_started = time.perf_counter()
+        gen_result = await generate_image(
             prompt=current_prompt, 
             reference_images=reference_images,
             previous_response_id=current_openai_response_id,
             quality=quality,
             size=size,
             background=background,
-            output_format=output_format
+            output_format=output_format,
+            hedge=hedge_requests,
+            background_mode=background_mode,
+            pack_references=pack_references,
         )
         image_url = gen_result["image_path"] or ""
         current_openai_response_id = gen_result["response_id"]
+        details = {
+            "response_id": current_openai_response_id,
+            "generation_seconds": time.perf_counter() - generation_started,
+        }
+        iteration_details.append(details)
+        yield loop_events.GenerationFinished(
+            iteration=iteration,
+            image_path=image_url or None,
+            response_id=current_openai_response_id,
+        )
 
         if not image_url:
-            print("Failed to generate image in this iteration. Skipping evaluation and prompting.", file=sys.stderr)
-            full_history.append({
-                "prompter_query": iteration_prompt,
-                "result_image": None,
-                "evaluator_query": None,
-                "score": None,
-            })
+            record_failed_generation(full_history, iteration_prompt)
             if not current_openai_response_id:
                 print("Critical failure in initial image generation. Aborting loop.", file=sys.stderr)
                 break
             continue
 
-     
-        evaluation = await evaluator.evaluate_image(image_url, iteration_prompt)
-       
-        
-        iteration_feedback = evaluation["feedback"]
-        score = evaluation["score"]
+        score, iteration_feedback = await score_iteration(
+            image_url,
+            iteration_prompt,
+            full_history,
+            scored_hashes,
+            scored_indices,
+            evaluation_fidelity=evaluation_fidelity,
+            hedge_requests=hedge_requests,
+            evaluation_cascade=evaluation_cascade,
+            details=details,
+        )
 
-        full_history.append({
-            "prompter_query": iteration_prompt,
-            "result_image": image_url,
-            "evaluator_query": iteration_feedback,
-            "score": score,
-        })
+        yield loop_events.EvaluationResult(
+            iteration=iteration,
+            image_path=image_url,
+            score=score,
+            feedback=full_history[-1]["evaluator_query"],
+            duplicate_of=full_history[-1].get("duplicate_of"),
+        )
 
         if score > best_score:
             best_score = score
             best_image_url = image_url
+            best_prompt = iteration_prompt
 
         if score >= SCORE_THRESHOLD:
             break
 
-        current_prompt = await prompter.generate_prompt(iteration_prompt, iteration_feedback)
+        history = context.render()
+        context.add(iteration, iteration_prompt, score, iteration_feedback)
+        current_prompt = await prompter.generate_prompt(
+            iteration_prompt, iteration_feedback, history=history or None
+        )
+        yield loop_events.PromptRefined(iteration=iteration, prompt=current_prompt)
+
+        await run_orchestrator.run_and_stream(
+            thread_id, assistant_id, max_recent_messages=context_window.THREAD_RECENT_MESSAGES
+        )
 
-        await run_orchestrator.run_and_stream(thread_id, assistant_id)
+    metrics.LOOP_RUNS.labels(
+        outcome="threshold_met" if best_score >= SCORE_THRESHOLD else "threshold_not_met"
+    ).inc()
+    metrics.LOOP_ITERATIONS.labels().observe(len(full_history))
+    if best_score >= 0:
+        metrics.LOOP_FINAL_SCORES.labels().observe(best_score)
 
-    return {
+    result = {
         "best_image_url": best_image_url,
         "final_score": best_score,
         "full_history": full_history,
         "thread_id": thread_id,
     }
+    if prompt_index_path and best_image_url:
+        try:
+            await offload.run_cpu(
+                prompt_index.append_record,
+                prompt_index_path,
+                prompt_index.PromptRecord(prompt, best_prompt, best_score),
+            )
+        except Exception as e:
+            print(
+                f"Warning: Failed to record prompt history in {prompt_index_path}: {e}",
+                file=sys.stderr,
+            )
+    if archive_path:
+        try:
+            await offload.run_cpu(
+                run_archive.record_run,
+                archive_path,
+                {
+                    "started_at": started_at,
+                    "finished_at": time.time(),
+                    "category": category,
+                    "prompt": prompt,
+                    "quality": quality,
+                    "size": size,
+                    "background": background,
+                    "output_format": output_format,
+                    "evaluation_fidelity": evaluation_fidelity,
+                    "thread_id": thread_id,
+                    "best_image_path": best_image_url or None,
+                    "final_score": best_score if best_score >= 0 else None,
+                    "iterations": len(full_history),
+                    "threshold_met": int(best_score >= SCORE_THRESHOLD),
+                },
+                full_history,
+                iteration_details,
+            )
+        except Exception as e:
+            print(f"Warning: Failed to archive run to {archive_path}: {e}", file=sys.stderr)
+    if derivatives and best_image_url:
+        result["derivatives"] = await derivatives_module.render_derivatives(
+            best_image_url, derivatives
+        )
+
+    yield loop_events.LoopFinished(result=result)
+
+
+def record_failed_generation(full_history: List[dict], prompt: str) -> None:
+    """Record an iteration whose generation produced no image."""
+    print(
+        "Failed to generate image in this iteration. Skipping evaluation and prompting.",
+        file=sys.stderr,
+    )
+    full_history.append({
+        "prompter_query": prompt,
+        "result_image": None,
+        "evaluator_query": None,
+        "score": None,
+    })
+
+
+async def score_iteration(
+    image_path: str,
+    prompt: str,
+    full_history: List[dict],
+    scored_hashes: List[int | None],
+    scored_indices: List[int],
+    evaluation_fidelity: str = evaluator.DEFAULT_FIDELITY,
+    hedge_requests: bool = False,
+    evaluation_cascade: evaluator.CascadePolicy | None = None,
+    details: dict | None = None,
+) -> tuple[int, str]:
+    """Score a generated image and append its iteration to ``full_history``.
+
+    An image within ``DUPLICATE_HASH_DISTANCE`` of an earlier evaluated image, and
+    within ``DUPLICATE_PIXEL_DIFFERENCE`` of it in every block of the pixel check,
+    reuses that image's score without an evaluator call, and its feedback tells the
+    prompter to make a more substantial change.
+
+    Args:
+        image_path: The generated image.
+        prompt: The prompt that produced it.
+        full_history: The run's history, extended in place.
+        scored_hashes: Perceptual hashes of evaluated images, extended in place.
+        scored_indices: The ``full_history`` index of each entry of ``scored_hashes``.
+        evaluation_fidelity: Image fidelity tier sent to the evaluator.
+        hedge_requests: Whether the evaluation call may be hedged.
+        evaluation_cascade: Optional first-pass policy for the evaluation.
+        details: Optional per-iteration details; the image hash and evaluation time
+            are recorded there.
+
+    Returns:
+        The score and the feedback to refine the prompt with.
+    """
+    current_hash = await offload.run_cpu(image_hash.compute_dhash, image_path)
+    if details is not None and current_hash is not None:
+        details["image_hash"] = f"{current_hash:0{image_hash.HASH_SIZE ** 2 // 4}x}"
+    duplicate = image_hash.find_near_duplicate(current_hash, scored_hashes, DUPLICATE_HASH_DISTANCE)
+    if duplicate is not None:
+        difference = await offload.run_cpu(
+            image_hash.pixel_difference,
+            image_path,
+            full_history[scored_indices[duplicate]]["result_image"],
+        )
+        if difference is None or difference > DUPLICATE_PIXEL_DIFFERENCE:
+            duplicate = None
+
+    if duplicate is not None:
+        metrics.DUPLICATE_IMAGES.labels().inc()
+        original_index = scored_indices[duplicate]
+        original = full_history[original_index]
+        full_history.append({
+            "prompter_query": prompt,
+            "result_image": image_path,
+            "evaluator_query": original["evaluator_query"],
+            "score": original["score"],
+            "duplicate_of": original_index,
+            "note": (
+                f"Near-duplicate of iteration {original_index + 1}; score reused without evaluation."
+            ),
+        })
+        feedback = (
+            f"No change produced: the generated image is nearly identical to iteration "
+            f"{original_index + 1}. Make a more substantial change to address this feedback: "
+            f"{original['evaluator_query']}"
+        )
+        return original["score"], feedback
+
+    evaluation_started = time.perf_counter()
+    evaluation = await evaluator.evaluate_image(
+        image_path,
+        prompt,
+        fidelity=evaluation_fidelity,
+        hedge=hedge_requests,
+        cascade=evaluation_cascade,
+    )
+    if details is not None:
+        details["evaluation_seconds"] = time.perf_counter() - evaluation_started
+
+    scored_hashes.append(current_hash)
+    scored_indices.append(len(full_history))
+    full_history.append({
+        "prompter_query": prompt,
+        "result_image": image_path,
+        "evaluator_query": evaluation["feedback"],
+        "score": evaluation["score"],
+    })
+    return evaluation["score"], evaluation["feedback"]
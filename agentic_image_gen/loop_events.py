@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+from typing import Any, ClassVar
+
+
+@dataclass
+class LoopEvent:
+    """Base class for events yielded by ``iterate_image_generation_loop``."""
+
+    event: ClassVar[str] = "event"
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return a JSON-serialisable dict with the event name under ``"event"``."""
+        return {"event": self.event, **asdict(self)}
+
+
+@dataclass
+class GenerationStarted(LoopEvent):
+    """An image generation request is about to be sent."""
+
+    event: ClassVar[str] = "generation_started"
+    iteration: int
+    prompt: str
+
+
+@dataclass
+class GenerationFinished(LoopEvent):
+    """An image generation request completed; ``image_path`` is None on failure."""
+
+    event: ClassVar[str] = "generation_finished"
+    iteration: int
+    image_path: str | None
+    response_id: str | None
+
+
+@dataclass
+class EvaluationResult(LoopEvent):
+    """A generated image was scored, or matched to a previously scored duplicate."""
+
+    event: ClassVar[str] = "evaluation_result"
+    iteration: int
+    image_path: str
+    score: int
+    feedback: str
+    duplicate_of: int | None = None
+
+
+@dataclass
+class PromptRefined(LoopEvent):
+    """The prompter produced the prompt for the next iteration."""
+
+    event: ClassVar[str] = "prompt_refined"
+    iteration: int
+    prompt: str
+
+
+@dataclass
+class LoopFinished(LoopEvent):
+    """The loop ended; ``result`` is what ``run_image_generation_loop`` returns."""
+
+    event: ClassVar[str] = "final"
+    result: dict[str, Any]
@@ -1,11 +1,10 @@
 from __future__ import annotations
 
-import asyncio
 from typing import List, cast
 
 from openai.types.beta.threads import message_create_params
 
-from .assistant_manager import get_client
+from .assistant_manager import get_async_client
 
 
 async def send_message(thread_id: str, prompt: str, images: List[str]) -> str:
@@ -19,11 +18,10 @@ async def send_message(thread_id: str, prompt: str, images: List[str]) -> str:
     Returns:
         The ID of the created message.
     """
-    client = get_client()
+    client = get_async_client()
     attachments = [{"file_id": file_id, "tools": [{"type": "file_search"}]} for file_id in images]
     typed_attachments = cast("list[message_create_params.Attachment]", attachments)
-    message = await asyncio.to_thread(
-        client.beta.threads.messages.create,
+    message = await client.beta.threads.messages.create(
         thread_id=thread_id,
         role="user",
         content=prompt,
@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+import abc
+import bisect
+import math
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Sequence
+
+from aiohttp import web
+
+DEFAULT_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+SCORE_BUCKETS = (10, 20, 30, 40, 50, 60, 70, 80, 90, 95, 100)
+ITERATION_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Bind the metrics endpoint to loopback unless another interface is asked for.
+DEFAULT_HTTP_HOST = "127.0.0.1"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric(abc.ABC):
+    """Base class holding one child per combination of label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """Create the child holding the value for one combination of label values."""
+
+    def labels(self, **labelvalues: str):
+        """Return the child metric for the given label values, creating it on first use."""
+        key = tuple(str(labelvalues[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    @abc.abstractmethod
+    def _samples(self) -> Iterable[str]:
+        """Yield one exposition line per sample."""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class _CounterChild:
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def _samples(self) -> Iterable[str]:
+        for key, child in list(self._children.items()):
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}{labels} {_format_value(child.value)}"
+
+
+class _GaugeChild(_CounterChild):
+    def set(self, value: float) -> None:
+        with self._lock:
+            self.value = value
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+
+class Gauge(Counter):
+    """Value that can go up and down."""
+
+    kind = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def _samples(self) -> Iterable[str]:
+        for key, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), child.counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                labels = _format_labels(self.labelnames, key, le)
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(child.sum)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    """Collection of metrics rendered together in Prometheus text format."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Render every registered metric in the Prometheus text exposition format."""
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+API_CALLS = REGISTRY.counter(
+    "agentic_image_gen_api_calls_total",
+    "OpenAI API calls by loop stage and outcome.",
+    ("stage", "outcome"),
+)
+STAGE_LATENCY = REGISTRY.histogram(
+    "agentic_image_gen_stage_duration_seconds",
+    "Wall-clock duration of each loop stage call.",
+    ("stage",),
+)
+EVALUATION_SCORES = REGISTRY.histogram(
+    "agentic_image_gen_evaluation_score",
+    "Scores returned by the evaluator.",
+    buckets=SCORE_BUCKETS,
+)
+LOOP_RUNS = REGISTRY.counter(
+    "agentic_image_gen_loop_runs_total",
+    "Completed loop runs by whether the score threshold was reached.",
+    ("outcome",),
+)
+LOOP_ITERATIONS = REGISTRY.histogram(
+    "agentic_image_gen_loop_iterations",
+    "Iterations per completed loop run.",
+    buckets=ITERATION_BUCKETS,
+)
+LOOP_FINAL_SCORES = REGISTRY.histogram(
+    "agentic_image_gen_loop_final_score",
+    "Best score per completed loop run.",
+    buckets=SCORE_BUCKETS,
+)
+DUPLICATE_IMAGES = REGISTRY.counter(
+    "agentic_image_gen_duplicate_images_total",
+    "Generated images whose evaluation was skipped as near-duplicates.",
+)
+EVALUATION_CASCADE_DECISIONS = REGISTRY.counter(
+    "agentic_image_gen_evaluation_cascade_decisions_total",
+    "First-pass evaluations by outcome: trusted, or escalated for margin, uncertain, error or audit.",
+    ("reason",),
+)
+EVALUATION_CASCADE_AGREEMENT = REGISTRY.counter(
+    "agentic_image_gen_evaluation_cascade_agreement_total",
+    "Escalated or audited first-pass scores by whether they fell on the same side of the threshold as the full score.",
+    ("agree",),
+)
+EVALUATION_CASCADE_SCORE_DIFFERENCE = REGISTRY.histogram(
+    "agentic_image_gen_evaluation_cascade_score_difference",
+    "Absolute difference between first-pass and full evaluation scores.",
+    buckets=(2, 5, 10, 15, 20, 30, 50, 100),
+)
+
+HEDGED_REQUESTS = REGISTRY.counter(
+    "agentic_image_gen_hedged_requests_total",
+    "Calls that launched a hedge request, by stage and which attempt won.",
+    ("stage", "winner"),
+)
+
+GENERATION_CACHE_LOOKUPS = REGISTRY.counter(
+    "agentic_image_gen_generation_cache_lookups_total",
+    "Generation cache lookups by result.",
+    ("result",),
+)
+
+BACKGROUND_RESPONSES_PENDING = REGISTRY.gauge(
+    "agentic_image_gen_background_responses_pending",
+    "Background-mode generations currently awaited by the shared poller.",
+)
+
+PIPELINE_QUEUE_DEPTH = REGISTRY.gauge(
+    "agentic_image_gen_pipeline_queue_depth",
+    "Jobs waiting in each pipeline stage's input queue.",
+    ("stage",),
+)
+
+PIPELINE_BUSY_WORKERS = REGISTRY.gauge(
+    "agentic_image_gen_pipeline_busy_workers",
+    "Pipeline workers currently processing a job, by stage.",
+    ("stage",),
+)
+
+
+def record_call(stage: str, started: float, success: bool) -> None:
+    """Count an API call for ``stage`` and record its latency.
+
+    Args:
+        stage: Loop stage name (generate, evaluate, prompt).
+        started: ``time.perf_counter()`` value taken when the call began.
+        success: Whether the call produced a usable result.
+    """
+    STAGE_LATENCY.labels(stage=stage).observe(time.perf_counter() - started)
+    API_CALLS.labels(stage=stage, outcome="success" if success else "failure").inc()
+
+
+def write_textfile(path: str | Path, registry: Registry = REGISTRY) -> None:
+    """Atomically write the registry to ``path`` for the node-exporter textfile collector."""
+    target = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(registry.render())
+        os.replace(tmp_path, target)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+async def start_http_server(
+    port: int, host: str = DEFAULT_HTTP_HOST, registry: Registry = REGISTRY
+) -> web.AppRunner:
+    """Serve the registry at ``/metrics`` on the running event loop.
+
+    Returns:
+        The aiohttp runner; call ``await runner.cleanup()`` to stop serving.
+    """
+
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(body=registry.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import functools
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, TypeVar
+
+T = TypeVar("T")
+
+# Payloads smaller than this are processed inline; the executor hop costs more than the work.
+DEFAULT_THRESHOLD_BYTES = 256 * 1024
+
+_threshold_bytes = DEFAULT_THRESHOLD_BYTES
+_max_workers: int | None = None
+_use_processes = False
+_cpu_executor: Executor | None = None
+
+
+def configure(
+    max_workers: int | None = None,
+    use_processes: bool = False,
+    threshold_bytes: int = DEFAULT_THRESHOLD_BYTES,
+) -> None:
+    """Configure the pool used for offloaded work.
+
+    Args:
+        max_workers: Worker count for the pool (None uses the executor default).
+        use_processes: Run offloaded work in a process pool instead of a thread pool.
+        threshold_bytes: Payloads below this size are processed on the event loop.
+    """
+    global _threshold_bytes, _max_workers, _use_processes
+    shutdown()
+    _threshold_bytes = threshold_bytes
+    _max_workers = max_workers
+    _use_processes = use_processes
+
+
+def shutdown() -> None:
+    """Shut down the pool if it has been started."""
+    global _cpu_executor
+    if _cpu_executor is not None:
+        _cpu_executor.shutdown(wait=False, cancel_futures=True)
+    _cpu_executor = None
+
+
+def _get_cpu_executor() -> Executor:
+    global _cpu_executor
+    if _cpu_executor is None:
+        if _use_processes:
+            _cpu_executor = ProcessPoolExecutor(max_workers=_max_workers)
+        else:
+            _cpu_executor = ThreadPoolExecutor(max_workers=_max_workers, thread_name_prefix="offload")
+    return _cpu_executor
+
+
+async def run_cpu(func: Callable[..., T], *args: Any, size: int | None = None) -> T:
+    """Run blocking CPU or disk work in the pool, or inline if ``size`` is below the threshold.
+
+    ``func`` and its arguments must be picklable when the process pool is enabled.
+
+    Args:
+        func: A module-level function to call.
+        *args: Positional arguments for ``func``.
+        size: Payload size in bytes; None always offloads.
+
+    Returns:
+        The return value of ``func``.
+    """
+    if size is not None and size < _threshold_bytes:
+        return func(*args)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_cpu_executor(), functools.partial(func, *args))
+
+
+def encode_data_url(binary_data: bytes, mime_type: str) -> str:
+    """Encode bytes as a base64 data URL."""
+    return f"data:{mime_type};base64,{base64.b64encode(binary_data).decode('utf-8')}"
+
+
+def encode_file_data_url(path: str, mime_type: str) -> str:
+    """Read a file and encode it as a base64 data URL."""
+    return encode_data_url(Path(path).read_bytes(), mime_type)
+
+
+def decode_to_file(base64_data: str, path: str) -> None:
+    """Decode base64 data and write the bytes to ``path``."""
+    Path(path).write_bytes(base64.b64decode(base64_data))
@@ -0,0 +1,326 @@
+from __future__ import annotations
+
+import asyncio
+import sys
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+from . import (
+    assistant_manager,
+    context_window,
+    evaluator,
+    image_gen,
+    loop_controller,
+    metrics,
+    prompter,
+    run_orchestrator,
+    thread_manager,
+)
+
+STAGES = ("generate", "evaluate", "refine")
+
+
+@dataclass
+class StageConfig:
+    """Worker count and input queue size of one pipeline stage."""
+
+    workers: int = 1
+    queue_size: int = 8
+
+
+DEFAULT_STAGES = {
+    "generate": StageConfig(workers=4, queue_size=8),
+    "evaluate": StageConfig(workers=8, queue_size=16),
+    "refine": StageConfig(workers=4, queue_size=8),
+}
+
+
+@dataclass
+class _Job:
+    """State of one prompt as it cycles through the stages."""
+
+    prompt: str
+    reference_images: list[str] | None
+    thread_id: str
+    context: context_window.ContextWindow
+    future: asyncio.Future
+    current_prompt: str = ""
+    response_id: str | None = None
+    iteration: int = 0
+    image_path: str = ""
+    # Latest critique and the history of attempts before it, consumed by the refine stage.
+    feedback: str = ""
+    history: str = ""
+    best_score: int = -1
+    best_image_url: str = ""
+    full_history: list[dict] = field(default_factory=list)
+    # Perceptual hashes of evaluated images and the history index each one was scored at.
+    scored_hashes: list[int | None] = field(default_factory=list)
+    scored_indices: list[int] = field(default_factory=list)
+
+    def result(self) -> dict:
+        return {
+            "best_image_url": self.best_image_url,
+            "final_score": self.best_score,
+            "full_history": self.full_history,
+            "thread_id": self.thread_id,
+        }
+
+
+class Pipeline:
+    """Runs many prompts through generate, evaluate and refine stages concurrently.
+
+    Each stage has its own worker pool and a bounded input queue, so every stage can
+    be sized to its own rate limits and latency. A job moves generate → evaluate →
+    refine → generate until it meets ``SCORE_THRESHOLD`` or ``MAX_ITERATIONS`` (see
+    ``loop_controller``). A worker blocks when the next stage's queue is full, and
+    ``submit`` blocks when ``max_in_flight`` jobs are running, so admission slows to
+    the pace of the bottleneck stage.
+
+    ``max_in_flight`` must stay below the total queue and worker capacity. Jobs cycle
+    back to generation, so filling every queue and worker would deadlock the stages.
+
+    Unlike ``run_image_generation_loop``, a job's final iteration is not refined, and
+    the generation cache, prompt index, run archive and derivatives are not applied.
+    """
+
+    def __init__(
+        self,
+        quality: str,
+        size: str,
+        background: str,
+        output_format: str,
+        stages: dict[str, StageConfig] | None = None,
+        max_in_flight: int | None = None,
+        evaluation_fidelity: str = evaluator.DEFAULT_FIDELITY,
+        evaluation_cascade: evaluator.CascadePolicy | None = None,
+        hedge_requests: bool = False,
+        background_mode: bool = False,
+        pack_references: bool = False,
+        context_token_budget: int = context_window.DEFAULT_TOKEN_BUDGET,
+    ) -> None:
+        """Configure the pipeline; call ``start`` (or use ``async with``) before submitting.
+
+        Args:
+            quality: Quality of the generated images (low, medium, high, auto).
+            size: Dimensions of the generated images (e.g., 1024x1024).
+            background: Background of the generated images (opaque, transparent, auto).
+            output_format: Output format (png, jpeg, webp).
+            stages: Per-stage ``StageConfig``; stages left out use ``DEFAULT_STAGES``.
+            max_in_flight: Maximum jobs admitted at once. Defaults to the largest
+                deadlock-free value, one less than all queue and worker slots combined.
+            evaluation_fidelity: Image fidelity tier sent to the evaluator.
+            evaluation_cascade: Optional first-pass policy for the evaluate stage.
+            hedge_requests: Whether generation and evaluation calls may be hedged.
+            background_mode: Whether generations use background mode and the shared poller.
+            pack_references: Whether secondary references are packed into a contact sheet.
+            context_token_budget: Token budget for the prompter's history of earlier iterations.
+
+        Raises:
+            ValueError: If a stage is unknown or misconfigured, or ``max_in_flight``
+                could deadlock the stages.
+        """
+        unknown = set(stages or {}) - set(STAGES)
+        if unknown:
+            raise ValueError(f"Unknown pipeline stages {sorted(unknown)}; expected {STAGES}")
+        self.stages = {**DEFAULT_STAGES, **(stages or {})}
+        for name, config in self.stages.items():
+            if config.workers < 1 or config.queue_size < 1:
+                raise ValueError(f"Stage {name!r} needs at least one worker and one queue slot")
+        capacity = sum(config.workers + config.queue_size for config in self.stages.values())
+        if max_in_flight is None:
+            max_in_flight = capacity - 1
+        if not 1 <= max_in_flight < capacity:
+            raise ValueError(
+                f"max_in_flight must be between 1 and {capacity - 1} for these stage sizes"
+            )
+        self.max_in_flight = max_in_flight
+        self.generate_kwargs = {
+            "quality": quality,
+            "size": size,
+            "background": background,
+            "output_format": output_format,
+            "hedge": hedge_requests,
+            "background_mode": background_mode,
+            "pack_references": pack_references,
+        }
+        self.evaluation_fidelity = evaluation_fidelity
+        self.evaluation_cascade = evaluation_cascade
+        self.hedge_requests = hedge_requests
+        self.context_token_budget = context_token_budget
+
+        self._queues: dict[str, asyncio.Queue[_Job]] = {}
+        self._busy = {name: 0 for name in STAGES}
+        self._admission: asyncio.Semaphore | None = None
+        self._workers: list[asyncio.Task] = []
+        self._pending: set[asyncio.Future] = set()
+        self._assistant_id: str | None = None
+
+    async def __aenter__(self) -> "Pipeline":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        """Start every stage's workers."""
+        self._assistant_id = assistant_manager.load_assistant_id()
+        if self._assistant_id is None:
+            self._assistant_id = await assistant_manager.create_assistant()
+        self._admission = asyncio.Semaphore(self.max_in_flight)
+        handlers: dict[str, Callable[[_Job], Awaitable[str | None]]] = {
+            "generate": self._generate,
+            "evaluate": self._evaluate,
+            "refine": self._refine,
+        }
+        for name in STAGES:
+            self._queues[name] = asyncio.Queue(maxsize=self.stages[name].queue_size)
+            self._workers.extend(
+                asyncio.create_task(self._worker(name, handlers[name]))
+                for _ in range(self.stages[name].workers)
+            )
+        self._report(*STAGES)
+
+    async def close(self) -> None:
+        """Stop the workers. Jobs still in the pipeline are cancelled."""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        for queue in self._queues.values():
+            while not queue.empty():
+                queue.get_nowait()
+        self._busy = {name: 0 for name in STAGES}
+        self._report(*self._queues)
+
+    async def submit(self, prompt: str, reference_images: list[str] | None = None) -> asyncio.Future:
+        """Admit a prompt, waiting while ``max_in_flight`` jobs are running.
+
+        Returns:
+            A future resolving to the same dictionary ``run_image_generation_loop``
+            returns, or raising the error that stopped the job.
+        """
+        if self._admission is None:
+            raise RuntimeError("Pipeline.start() must be called before submitting jobs")
+        await self._admission.acquire()
+        try:
+            thread_id = await thread_manager.create_thread()
+        except BaseException:
+            self._admission.release()
+            raise
+        job = _Job(
+            prompt=prompt,
+            reference_images=reference_images,
+            thread_id=thread_id,
+            context=context_window.ContextWindow(self.context_token_budget),
+            future=asyncio.get_running_loop().create_future(),
+            current_prompt=prompt,
+        )
+        self._pending.add(job.future)
+        await self._put("generate", job)
+        return job.future
+
+    async def run(self, prompt: str, reference_images: list[str] | None = None) -> dict:
+        """Submit a prompt and wait for its result."""
+        return await (await self.submit(prompt, reference_images))
+
+    def queue_depths(self) -> dict[str, int]:
+        """Return the number of jobs waiting in each stage's queue."""
+        return {name: queue.qsize() for name, queue in self._queues.items()}
+
+    def busy_workers(self) -> dict[str, int]:
+        """Return the number of workers currently processing a job in each stage."""
+        return dict(self._busy)
+
+    def _report(self, *stage_names: str) -> None:
+        for name in stage_names:
+            metrics.PIPELINE_QUEUE_DEPTH.labels(stage=name).set(self._queues[name].qsize())
+            metrics.PIPELINE_BUSY_WORKERS.labels(stage=name).set(self._busy[name])
+
+    async def _put(self, stage: str, job: _Job) -> None:
+        await self._queues[stage].put(job)
+        self._report(stage)
+
+    def _finish(self, job: _Job, error: BaseException | None = None) -> None:
+        self._pending.discard(job.future)
+        if not job.future.done():
+            if error is not None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(job.result())
+        assert self._admission is not None
+        self._admission.release()
+
+    async def _worker(self, stage: str, handler: Callable[[_Job], Awaitable[str | None]]) -> None:
+        queue = self._queues[stage]
+        while True:
+            job = await queue.get()
+            self._busy[stage] += 1
+            self._report(stage)
+            try:
+                next_stage = await handler(job)
+            except Exception as e:
+                print(f"Error in pipeline stage {stage} for prompt {job.prompt!r}: {e}", file=sys.stderr)
+                self._finish(job, error=e)
+                continue
+            finally:
+                self._busy[stage] -= 1
+                queue.task_done()
+                self._report(stage)
+            if next_stage is None:
+                self._finish(job)
+            else:
+                await self._put(next_stage, job)
+
+    async def _generate(self, job: _Job) -> str | None:
+        job.iteration += 1
+        gen_result = await image_gen.generate_image(
+            prompt=job.current_prompt,
+            reference_images=job.reference_images,
+            previous_response_id=job.response_id,
+            **self.generate_kwargs,
+        )
+        job.image_path = gen_result["image_path"] or ""
+        job.response_id = gen_result["response_id"]
+        if job.image_path:
+            return "evaluate"
+
+        loop_controller.record_failed_generation(job.full_history, job.current_prompt)
+        if not job.response_id:
+            print("Critical failure in initial image generation. Aborting job.", file=sys.stderr)
+            return None
+        return "generate" if job.iteration < loop_controller.MAX_ITERATIONS else None
+
+    async def _evaluate(self, job: _Job) -> str | None:
+        score, feedback = await loop_controller.score_iteration(
+            job.image_path,
+            job.current_prompt,
+            job.full_history,
+            job.scored_hashes,
+            job.scored_indices,
+            evaluation_fidelity=self.evaluation_fidelity,
+            hedge_requests=self.hedge_requests,
+            evaluation_cascade=self.evaluation_cascade,
+        )
+        if score > job.best_score:
+            job.best_score = score
+            job.best_image_url = job.image_path
+        if score >= loop_controller.SCORE_THRESHOLD or job.iteration >= loop_controller.MAX_ITERATIONS:
+            return None
+        job.feedback = feedback
+        job.history = job.context.render()
+        job.context.add(job.iteration, job.current_prompt, score, feedback)
+        return "refine"
+
+    async def _refine(self, job: _Job) -> str:
+        job.current_prompt = await prompter.generate_prompt(
+            job.current_prompt, job.feedback, history=job.history or None
+        )
+        await run_orchestrator.run_and_stream(
+            job.thread_id, self._assistant_id, max_recent_messages=context_window.THREAD_RECENT_MESSAGES
+        )
+        return "generate"
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import json
+import re
+import sys
+from collections import Counter, deque
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+# Only runs that reached at least this score are used as warm-start examples.
+MIN_WINNING_SCORE = 80
+MIN_SIMILARITY = 0.2
+TOP_K = 3
+MAX_WARM_START_PHRASES = 6
+# Only the most recent runs are indexed, so warm starts stay fast as the history grows.
+MAX_INDEXED_RECORDS = 5000
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_CLAUSE_RE = re.compile(r"[,.;\n]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase word tokens used for TF-IDF vectors."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+@dataclass
+class PromptRecord:
+    """Outcome of one past run."""
+
+    user_prompt: str
+    final_prompt: str
+    score: int
+
+
+def append_record(path: str | Path, record: PromptRecord) -> None:
+    """Append a run outcome to the JSON-lines history file."""
+    with Path(path).open("a", encoding="utf-8") as f:
+        f.write(json.dumps(record.__dict__) + "\n")
+
+
+def load_records(path: str | Path, limit: int | None = MAX_INDEXED_RECORDS) -> list[PromptRecord]:
+    """Load the most recent ``limit`` run outcomes (all if None), skipping malformed lines."""
+    history_path = Path(path)
+    if not history_path.exists():
+        return []
+    with history_path.open(encoding="utf-8") as f:
+        lines = deque(f, maxlen=limit)
+    records: list[PromptRecord] = []
+    for line in lines:
+        try:
+            records.append(PromptRecord(**json.loads(line)))
+        except (json.JSONDecodeError, TypeError):
+            print(f"Warning: Skipping malformed prompt history line in {path}", file=sys.stderr)
+    return records
+
+
+class PromptIndex:
+    """TF-IDF index over the user prompts of past winning runs.
+
+    Document vectors are stored sparsely as (row, column, weight) triples, so memory
+    grows with the number of tokens rather than records times vocabulary.
+    """
+
+    def __init__(self, records: list[PromptRecord]) -> None:
+        self.records = [r for r in records if r.score >= MIN_WINNING_SCORE]
+        documents = [tokenize(r.user_prompt) for r in self.records]
+        self.vocabulary = {
+            token: i for i, token in enumerate(sorted({t for doc in documents for t in doc}))
+        }
+        term_counts = [Counter(self.vocabulary[token] for token in doc) for doc in documents]
+        self._rows = np.repeat(np.arange(len(documents)), [len(c) for c in term_counts])
+        self._columns = np.fromiter(
+            (column for c in term_counts for column in c), dtype=np.intp, count=len(self._rows)
+        )
+        counts = np.fromiter(
+            (n for c in term_counts for n in c.values()), dtype=np.float32, count=len(self._rows)
+        )
+        document_frequency = np.bincount(self._columns, minlength=len(self.vocabulary))
+        self.idf = np.log((1 + len(documents)) / (1 + document_frequency)).astype(np.float32) + 1
+        weights = counts * self.idf[self._columns]
+        norms = np.sqrt(np.bincount(self._rows, weights=weights**2, minlength=len(documents)))
+        self._weights = weights / norms[self._rows]
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _vectorize(self, text: str) -> np.ndarray:
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for token in tokenize(text):
+            index = self.vocabulary.get(token)
+            if index is not None:
+                vector[index] += 1
+        return self._normalize(vector * self.idf)
+
+    def search(self, query: str, k: int = TOP_K) -> list[tuple[PromptRecord, float]]:
+        """Return up to ``k`` past runs most similar to ``query``, best first.
+
+        Ties in similarity are broken by the higher final score.
+        """
+        if not self.records:
+            return []
+        query_vector = self._vectorize(query)
+        similarities = np.bincount(
+            self._rows,
+            weights=self._weights * query_vector[self._columns],
+            minlength=len(self.records),
+        )
+        k = min(k, len(self.records))
+        candidates = np.argpartition(-similarities, k - 1)[:k]
+        ranked = sorted(
+            candidates, key=lambda i: (-similarities[i], -self.records[i].score)
+        )
+        return [
+            (self.records[i], float(similarities[i]))
+            for i in ranked
+            if similarities[i] >= MIN_SIMILARITY
+        ]
+
+
+def warm_start_phrases(prompt: str, matches: list[tuple[PromptRecord, float]]) -> list[str]:
+    """Collect refinements that past winning prompts added beyond their user prompts.
+
+    A clause of a winning final prompt counts as a refinement when most of its words
+    appear in neither the past user prompt nor the new ``prompt``.
+    """
+    known = set(tokenize(prompt))
+    phrases: list[str] = []
+    seen: set[str] = set()
+    for record, _ in matches:
+        original = set(tokenize(record.user_prompt)) | known
+        for clause in _CLAUSE_RE.split(record.final_prompt):
+            clause = clause.strip()
+            tokens = tokenize(clause)
+            if not tokens:
+                continue
+            novel = [t for t in tokens if t not in original]
+            key = " ".join(tokens)
+            if len(novel) * 2 >= len(tokens) and key not in seen:
+                seen.add(key)
+                phrases.append(clause)
+            if len(phrases) >= MAX_WARM_START_PHRASES:
+                return phrases
+    return phrases
+
+
+def warm_start_prompt(prompt: str, history_path: str | Path) -> str:
+    """Extend ``prompt`` with proven refinements from the most similar past runs.
+
+    Args:
+        prompt: The user's initial prompt.
+        history_path: JSON-lines file written by ``append_record``.
+
+    Returns:
+        The prompt with refinements appended, or ``prompt`` unchanged if nothing matched.
+    """
+    index = PromptIndex(load_records(history_path))
+    phrases = warm_start_phrases(prompt, index.search(prompt))
+    if not phrases:
+        return prompt
+    return f"{prompt.rstrip().rstrip('.')}. {', '.join(phrases)}."
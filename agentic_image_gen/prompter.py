@@ -1,33 +1,46 @@
 from __future__ import annotations
 
 import os
+import time
 
 from openai import AsyncOpenAI
 
-SYSTEM_PROMPT = "You refine image generation prompts based on evaluator feedback while keeping the original intent."
+from . import metrics
 
+SYSTEM_PROMPT = (
+    "You refine image generation prompts based on evaluator feedback while keeping the original intent. "
+    "Keep the refined prompt concise: replace or tighten earlier wording instead of appending to it."
+)
 
-async def generate_prompt(previous_prompt: str, feedback: str) -> str:
+
+async def generate_prompt(previous_prompt: str, feedback: str, history: str | None = None) -> str:
     """Generate a refined prompt using OpenAI's API.
 
     Args:
         previous_prompt: The prior prompt that was used for image generation.
         feedback: Feedback from the evaluator describing how to improve the prompt.
+        history: Optional compact summary of earlier attempts (see ``context_window.py``).
 
     Returns:
         The refined prompt suggested by the language model.
     """
     client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    response = await client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {
-                "role": "user",
-                "content": f"Prompt: {previous_prompt}\nFeedback: {feedback}",
-            },
-        ],
-        temperature=0.2,
-    )
+    user_content = f"Prompt: {previous_prompt}\nFeedback: {feedback}"
+    if history:
+        user_content = f"Earlier attempts:\n{history}\n\n{user_content}"
+    started = time.perf_counter()
+    try:
+        response = await client.chat.completions.create(
+            model="gpt-4o",
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": user_content},
+            ],
+            temperature=0.2,
+        )
+    except Exception:
+        metrics.record_call("prompt", started, success=False)
+        raise
+    metrics.record_call("prompt", started, success=True)
     content = response.choices[0].message.content or ""
     return content.strip()
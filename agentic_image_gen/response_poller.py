@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+from typing import Any
+
+from openai import AsyncOpenAI
+
+from . import metrics
+
+POLL_INTERVAL = 2.0
+# Upper bound on concurrent retrieve requests per polling round.
+MAX_CONCURRENT_RETRIEVES = 32
+# Consecutive failed retrieves after which a response ID is given up on.
+MAX_RETRIEVE_FAILURES = 5
+DEFAULT_WAIT_TIMEOUT = 900.0
+PENDING_STATUSES = ("queued", "in_progress")
+
+
+class ResponsePoller:
+    """Awaits many background-mode responses with one shared polling task.
+
+    Callers submit a request with ``background=True`` and ``await wait(response_id)``.
+    A single task retrieves every pending ID once per ``interval`` over one client,
+    so no HTTP request stays open while a generation runs and a dropped connection
+    only costs a retry of the next retrieve.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI | None = None,
+        interval: float = POLL_INTERVAL,
+        max_concurrency: int = MAX_CONCURRENT_RETRIEVES,
+    ) -> None:
+        self.client = client or AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.interval = interval
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._waiters: dict[str, list[asyncio.Future]] = {}
+        self._failures: dict[str, int] = {}
+        self._task: asyncio.Task | None = None
+
+    @property
+    def pending(self) -> int:
+        """Number of response IDs currently being polled."""
+        return len(self._waiters)
+
+    async def wait(self, response_id: str, timeout: float | None = DEFAULT_WAIT_TIMEOUT) -> Any:
+        """Wait until a background response reaches a terminal status.
+
+        Args:
+            response_id: ID returned when the request was submitted.
+            timeout: Seconds to wait before giving up (None waits indefinitely).
+                The response keeps running server-side and can be waited on again.
+
+        Returns:
+            The final response object. Its ``status`` is ``completed``, ``failed``,
+            ``cancelled`` or ``incomplete``.
+
+        Raises:
+            asyncio.TimeoutError: If ``timeout`` elapses first.
+            Exception: The last retrieve error, if retrieving failed repeatedly.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(response_id, []).append(future)
+        metrics.BACKGROUND_RESPONSES_PENDING.labels().set(self.pending)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._poll())
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            waiters = self._waiters.get(response_id)
+            if waiters is not None and future in waiters:
+                waiters.remove(future)
+                if not waiters:
+                    self._forget(response_id)
+
+    def _forget(self, response_id: str) -> None:
+        self._waiters.pop(response_id, None)
+        self._failures.pop(response_id, None)
+        metrics.BACKGROUND_RESPONSES_PENDING.labels().set(self.pending)
+
+    def _resolve(self, response_id: str, result: Any = None, error: BaseException | None = None) -> None:
+        for future in self._waiters.get(response_id, []):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        self._forget(response_id)
+
+    async def _retrieve(self, response_id: str) -> Any:
+        async with self._semaphore:
+            return await self.client.responses.retrieve(response_id)
+
+    async def _poll(self) -> None:
+        while self._waiters:
+            await asyncio.sleep(self.interval)
+            response_ids = list(self._waiters)
+            results = await asyncio.gather(
+                *(self._retrieve(response_id) for response_id in response_ids),
+                return_exceptions=True,
+            )
+            for response_id, result in zip(response_ids, results):
+                if response_id not in self._waiters:
+                    continue
+                if isinstance(result, Exception):
+                    failures = self._failures.get(response_id, 0) + 1
+                    self._failures[response_id] = failures
+                    print(
+                        f"Warning: Failed to poll background response {response_id} "
+                        f"({failures}/{MAX_RETRIEVE_FAILURES}): {result}",
+                        file=sys.stderr,
+                    )
+                    if failures >= MAX_RETRIEVE_FAILURES:
+                        self._resolve(response_id, error=result)
+                    continue
+                self._failures.pop(response_id, None)
+                if getattr(result, "status", None) not in PENDING_STATUSES:
+                    self._resolve(response_id, result)
+
+
+_poller: ResponsePoller | None = None
+_poller_loop: asyncio.AbstractEventLoop | None = None
+
+
+def get_poller() -> ResponsePoller:
+    """Return the poller shared by all background requests on the running event loop."""
+    global _poller, _poller_loop
+    loop = asyncio.get_running_loop()
+    if _poller is None or _poller_loop is not loop:
+        _poller = ResponsePoller()
+        _poller_loop = loop
+    return _poller
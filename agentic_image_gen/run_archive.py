@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Any
+
+DEFAULT_ARCHIVE_PATH = Path("run_archive.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started_at REAL NOT NULL,
+    finished_at REAL NOT NULL,
+    category TEXT,
+    prompt TEXT NOT NULL,
+    quality TEXT,
+    size TEXT,
+    background TEXT,
+    output_format TEXT,
+    evaluation_fidelity TEXT,
+    thread_id TEXT,
+    best_image_path TEXT,
+    final_score INTEGER,
+    iterations INTEGER NOT NULL,
+    threshold_met INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_started_at ON runs (started_at);
+CREATE INDEX IF NOT EXISTS runs_category_started_at ON runs (category, started_at);
+
+CREATE TABLE IF NOT EXISTS iterations (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    iteration INTEGER NOT NULL,
+    prompt TEXT,
+    image_path TEXT,
+    image_hash TEXT,
+    score INTEGER,
+    feedback TEXT,
+    response_id TEXT,
+    duplicate_of INTEGER,
+    generation_seconds REAL,
+    evaluation_seconds REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS iterations_run_iteration ON iterations (run_id, iteration);
+CREATE INDEX IF NOT EXISTS iterations_image_hash ON iterations (image_hash);
+CREATE INDEX IF NOT EXISTS iterations_response_id ON iterations (response_id);
+"""
+
+
+def connect(path: str | Path) -> sqlite3.Connection:
+    """Open the archive, creating the schema if needed."""
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def record_run(
+    path: str | Path,
+    run: dict[str, Any],
+    full_history: list[dict],
+    iteration_details: list[dict],
+) -> int:
+    """Store a finished run and all of its iterations in one transaction.
+
+    Args:
+        path: SQLite database file.
+        run: Run-level columns of the ``runs`` table (``id`` is assigned here).
+        full_history: The loop's ``full_history`` entries.
+        iteration_details: Per-iteration ``image_hash``, ``response_id``,
+            ``generation_seconds`` and ``evaluation_seconds``, aligned with ``full_history``.
+
+    Returns:
+        The new run's ID.
+    """
+    columns = ", ".join(run)
+    placeholders = ", ".join(f":{name}" for name in run)
+    with closing(connect(path)) as conn, conn:
+        run_id = conn.execute(f"INSERT INTO runs ({columns}) VALUES ({placeholders})", run).lastrowid
+        conn.executemany(
+            """
+            INSERT INTO iterations (
+                run_id, iteration, prompt, image_path, image_hash, score, feedback,
+                response_id, duplicate_of, generation_seconds, evaluation_seconds
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (
+                    run_id,
+                    index + 1,
+                    entry["prompter_query"],
+                    entry["result_image"],
+                    details.get("image_hash"),
+                    entry["score"],
+                    entry["evaluator_query"],
+                    details.get("response_id"),
+                    entry.get("duplicate_of"),
+                    details.get("generation_seconds"),
+                    details.get("evaluation_seconds"),
+                )
+                for index, (entry, details) in enumerate(zip(full_history, iteration_details))
+            ],
+        )
+    return run_id
+
+
+def _filters(since_days: float | None, category: str | None) -> tuple[str, list[Any]]:
+    clauses: list[str] = []
+    params: list[Any] = []
+    if category is not None:
+        clauses.append("category = ?")
+        params.append(category)
+    if since_days is not None:
+        clauses.append("started_at >= ?")
+        params.append(time.time() - since_days * 86400)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def list_runs(
+    path: str | Path,
+    since_days: float | None = None,
+    category: str | None = None,
+    limit: int = 20,
+) -> list[dict]:
+    """Return the most recent runs, newest first."""
+    where, params = _filters(since_days, category)
+    with closing(connect(path)) as conn:
+        rows = conn.execute(
+            f"""
+            SELECT id, started_at, category, prompt, final_score, iterations, threshold_met,
+                   best_image_path
+            FROM runs{where}
+            ORDER BY started_at DESC
+            LIMIT ?
+            """,
+            [*params, limit],
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def run_stats(
+    path: str | Path, since_days: float | None = None, category: str | None = None
+) -> list[dict]:
+    """Aggregate runs per category.
+
+    Reads only the ``runs`` table, whose per-run iteration counts and scores are
+    stored at write time, so it stays fast however many iterations are archived.
+
+    Returns:
+        One dict per category with run count, threshold rate, average iterations to
+        threshold (over runs that met it) and average final score.
+    """
+    where, params = _filters(since_days, category)
+    with closing(connect(path)) as conn:
+        rows = conn.execute(
+            f"""
+            SELECT category,
+                   COUNT(*) AS runs,
+                   AVG(threshold_met) AS threshold_rate,
+                   AVG(CASE WHEN threshold_met THEN iterations END) AS avg_iterations_to_threshold,
+                   AVG(final_score) AS avg_final_score
+            FROM runs{where}
+            GROUP BY category
+            ORDER BY runs DESC
+            """,
+            params,
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def get_iterations(path: str | Path, run_id: int) -> list[dict]:
+    """Return every stored iteration of one run, in order."""
+    with closing(connect(path)) as conn:
+        rows = conn.execute(
+            "SELECT * FROM iterations WHERE run_id = ? ORDER BY iteration", (run_id,)
+        ).fetchall()
+    return [dict(row) for row in rows]
@@ -1,36 +1,38 @@
 from __future__ import annotations
 
-import os
-
-from openai import AsyncOpenAI
 from openai.lib.streaming import AsyncAssistantEventHandler
 
-
-def get_async_client() -> AsyncOpenAI:
-    """Create an asynchronous OpenAI client using the API key from the environment."""
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY environment variable is required")
-    return AsyncOpenAI(api_key=api_key)
+from .assistant_manager import get_async_client
 
 
-async def run_and_stream(thread_id: str, assistant_id: str) -> list[dict]:
+async def run_and_stream(
+    thread_id: str, assistant_id: str, max_recent_messages: int | None = None
+) -> list[dict]:
     """Run the assistant on the given thread and capture tool call information.
 
     Args:
         thread_id: The thread identifier.
         assistant_id: The assistant identifier.
+        max_recent_messages: If set, only this many of the most recent thread messages
+            are sent to the model, so run cost does not grow with the thread.
 
     Returns:
         A list of dictionaries describing tool calls encountered during the run.
     """
     client = get_async_client()
     handler = AsyncAssistantEventHandler()
+    run_params: dict = {}
+    if max_recent_messages is not None:
+        run_params["truncation_strategy"] = {
+            "type": "last_messages",
+            "last_messages": max_recent_messages,
+        }
 
     async with client.beta.threads.runs.stream(
         thread_id=thread_id,
         assistant_id=assistant_id,
         event_handler=handler,
+        **run_params,
     ) as event_handler:
         await event_handler.until_done()
 
@@ -1,13 +1,12 @@
 from __future__ import annotations
 
-import asyncio
 import json
 from pathlib import Path
 from typing import Optional
 
-from openai import OpenAI
+from openai import AsyncOpenAI
 
-from .assistant_manager import get_client
+from .assistant_manager import get_async_client
 
 CONFIG_PATH = Path("thread_config.json")
 
@@ -18,8 +17,8 @@ async def create_thread() -> str:
     Returns:
         str: The created thread ID.
     """
-    client: OpenAI = get_client()
-    thread = await asyncio.to_thread(client.beta.threads.create)
+    client: AsyncOpenAI = get_async_client()
+    thread = await client.beta.threads.create()
     CONFIG_PATH.write_text(json.dumps({"thread_id": thread.id}))
     return thread.id
 
@@ -0,0 +1,79 @@
+"""Measure event-loop lag while reference images are base64 encoded concurrently.
+
+Compares encoding on the event loop thread with offloading to the thread and
+process pools from ``agentic_image_gen.offload``. A ticker coroutine sleeps for
+1 ms in a loop; the lag is how late each tick wakes up.
+
+Usage:
+    python benchmarks/event_loop_lag.py [--payload-mb 8] [--tasks 16]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from agentic_image_gen import offload  # noqa: E402
+
+TICK = 0.001
+
+
+async def _ticker(stop: asyncio.Event, lags: list[float]) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - started - TICK)
+
+
+async def _measure(path: str, tasks: int, mode: str) -> tuple[float, float, float]:
+    if mode == "inline":
+        offload.configure(threshold_bytes=2**62)
+    else:
+        offload.configure(use_processes=(mode == "process"), threshold_bytes=0)
+    size = os.path.getsize(path)
+    lags: list[float] = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(_ticker(stop, lags))
+    await asyncio.sleep(0.05)
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(offload.run_cpu(offload.encode_file_data_url, path, "image/png", size=size) for _ in range(tasks))
+    )
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await ticker
+    offload.shutdown()
+    lags_ms = sorted(lag * 1000 for lag in lags)
+    p99 = lags_ms[min(len(lags_ms) - 1, int(0.99 * len(lags_ms)))]
+    return elapsed, p99, max(lags_ms)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--payload-mb", type=float, default=8.0)
+    parser.add_argument("--tasks", type=int, default=16)
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as f:
+        f.write(os.urandom(int(args.payload_mb * 1024 * 1024)))
+        path = f.name
+    try:
+        print(f"{args.tasks} concurrent encodes of {args.payload_mb:g} MB")
+        print(f"{'mode':<8} {'total s':>8} {'p99 lag ms':>11} {'max lag ms':>11}")
+        for mode in ("inline", "thread", "process"):
+            elapsed, p99, worst = await _measure(path, args.tasks, mode)
+            print(f"{mode:<8} {elapsed:>8.3f} {p99:>11.1f} {worst:>11.1f}")
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
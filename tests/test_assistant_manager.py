@@ -1,5 +1,5 @@
 import json
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
@@ -13,9 +13,9 @@ async def test_create_assistant_writes_config(tmp_path, monkeypatch):
 
     fake_assistant = MagicMock(id="asst_123")
     fake_client = MagicMock()
-    fake_client.beta.assistants.create.return_value = fake_assistant
+    fake_client.beta.assistants.create = AsyncMock(return_value=fake_assistant)
 
-    with patch("agentic_image_gen.assistant_manager.get_client", return_value=fake_client):
+    with patch("agentic_image_gen.assistant_manager.get_async_client", return_value=fake_client):
         assistant_id = await am.create_assistant()
 
     assert assistant_id == "asst_123"
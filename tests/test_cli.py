@@ -1,9 +1,12 @@
+import asyncio
+import json
 from types import SimpleNamespace
 from unittest.mock import AsyncMock
 
 import pytest
 
 from agentic_image_gen import cli
+from agentic_image_gen.loop_events import GenerationStarted, LoopFinished
 
 
 @pytest.mark.asyncio
@@ -22,3 +25,116 @@ async def test_cli_main_runs_loop(monkeypatch, capsys):
     mock_loop.assert_awaited_with("hello", None)
     captured = capsys.readouterr().out
     assert "img.png" in captured
+
+
+@pytest.mark.asyncio
+async def test_cli_stream_prints_ndjson(monkeypatch, capsys):
+    async def fake_iterate(*args, **kwargs):
+        yield GenerationStarted(iteration=1, prompt="hello")
+        yield LoopFinished(result={"best_image_url": "img.png"})
+
+    monkeypatch.setattr(cli, "iterate_image_generation_loop", fake_iterate)
+    monkeypatch.setattr(
+        cli.argparse.ArgumentParser,
+        "parse_args",
+        lambda self: SimpleNamespace(
+            prompt="hello",
+            refs=None,
+            quality="auto",
+            size="1024x1024",
+            background="auto",
+            format="png",
+            eval_fidelity="full",
+            stream=True,
+            hedge=False,
+            derivatives=None,
+            context_tokens=600,
+            prompt_index=None,
+            archive="run_archive.sqlite3",
+            no_archive=True,
+            category=None,
+            background_mode=False,
+            eval_cascade_margin=None,
+            eval_cascade_audit=0.0,
+            pack_refs=False,
+            cache_dir=None,
+            cache_max_mb=1024,
+            offload_workers=None,
+            offload_processes=False,
+            metrics_port=None,
+            metrics_textfile=None,
+        ),
+    )
+
+    await cli.main()
+
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"event": "generation_started", "iteration": 1, "prompt": "hello"},
+        {"event": "final", "result": {"best_image_url": "img.png"}},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_cli_history_stats(monkeypatch, capsys, tmp_path):
+    db = tmp_path / "archive.sqlite3"
+    monkeypatch.setattr(
+        cli.sys, "argv", ["agentic_image_gen", "history", "--db", str(db), "--stats"]
+    )
+    mock_loop = AsyncMock()
+    monkeypatch.setattr(cli, "run_image_generation_loop", mock_loop)
+
+    await cli.main()
+
+    assert json.loads(capsys.readouterr().out) == []
+    mock_loop.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_cli_batch_prints_one_line_per_job(monkeypatch, capsys, tmp_path):
+    jobs = tmp_path / "jobs.jsonl"
+    jobs.write_text(
+        '{"prompt": "ring"}\n{"refs": ["b.png"]}\nnot json\n'
+        '{"prompt": "necklace", "refs": ["a.png"]}\n'
+    )
+    monkeypatch.setattr(
+        cli.sys,
+        "argv",
+        [
+            "agentic_image_gen", "batch", str(jobs), "--generate-workers", "1",
+            "--metrics-textfile", str(tmp_path / "metrics.prom"),
+        ],
+    )
+
+    class FakePipeline:
+        def __init__(self, *args, **kwargs):
+            self.stages = kwargs["stages"]
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc_info):
+            pass
+
+        async def submit(self, prompt, refs):
+            future = asyncio.get_running_loop().create_future()
+            future.set_result({"final_score": 99, "refs": refs})
+            return future
+
+    monkeypatch.setattr(cli.pipeline, "Pipeline", FakePipeline)
+    close_session = AsyncMock()
+    monkeypatch.setattr(cli.image_gen, "close_reference_session", close_session)
+
+    await cli.main()
+
+    lines = sorted(
+        (json.loads(line) for line in capsys.readouterr().out.splitlines()), key=lambda d: d["index"]
+    )
+    assert lines == [
+        {"index": 0, "prompt": "ring", "final_score": 99, "refs": None},
+        {"index": 1, "prompt": None, "error": 'job needs a non-empty "prompt" string'},
+        {"index": 2, "prompt": None, "error": "Expecting value: line 1 column 1 (char 0)"},
+        {"index": 3, "prompt": "necklace", "final_score": 99, "refs": ["a.png"]},
+    ]
+    close_session.assert_awaited_once()
+    assert "agentic_image_gen_pipeline_queue_depth" in (tmp_path / "metrics.prom").read_text()
@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+from agentic_image_gen import contact_sheet
+
+
+def test_compose_contact_sheet_grid_and_compositing():
+    red = Image.new("RGB", (200, 100), (255, 0, 0))
+    clear = Image.new("RGBA", (100, 100), (0, 0, 255, 0))
+    green = Image.new("RGB", (100, 100), (0, 255, 0))
+
+    sheet = contact_sheet.compose_contact_sheet(
+        [red, clear, green], ["1. red.png", "2. clear.png", "3. green.png"], tile_size=64
+    )
+
+    cell_height = 64 + contact_sheet.LABEL_HEIGHT
+    assert sheet.size == (2 * 64, 2 * cell_height)
+    pixels = np.asarray(sheet)
+    assert tuple(pixels[32, 32]) == (255, 0, 0)
+    # Transparent tiles and empty grid cells show the background.
+    assert tuple(pixels[32, 64 + 32]) == (255, 255, 255)
+    assert tuple(pixels[cell_height + 32, 64 + 32]) == (255, 255, 255)
+    assert tuple(pixels[cell_height + 32, 32]) == (0, 255, 0)
+
+
+def test_reference_set_key_tracks_contents_and_order(tmp_path):
+    a = tmp_path / "a.png"
+    b = tmp_path / "b.png"
+    a.write_bytes(b"a")
+    b.write_bytes(b"b")
+
+    key = contact_sheet.reference_set_key([str(a), str(b)])
+    assert contact_sheet.reference_set_key([str(a), str(b)]) == key
+    assert contact_sheet.reference_set_key([str(b), str(a)]) != key
+    b.write_bytes(b"changed")
+    assert contact_sheet.reference_set_key([str(a), str(b)]) != key
+
+
+def test_reference_label_truncates_long_names():
+    assert contact_sheet.reference_label(2, "https://cdn.example.com/img/side.jpg?v=1") == "2. side.jpg"
+    assert len(contact_sheet.reference_label(1, "x" * 100 + ".png")) == contact_sheet.LABEL_MAX_CHARS
+
+
+def test_prune_cache_evicts_least_recently_used(tmp_path):
+    for age, name in enumerate(["new", "mid", "old"]):
+        path = tmp_path / f"{name}.jpeg"
+        path.write_bytes(b"x" * 100)
+        os.utime(path, (1000 - age, 1000 - age))
+
+    contact_sheet.prune_cache(tmp_path, max_bytes=250)
+
+    assert sorted(p.stem for p in tmp_path.glob("*.jpeg")) == ["mid", "new"]
@@ -0,0 +1,33 @@
+from agentic_image_gen import context_window
+from agentic_image_gen.context_window import ContextWindow
+
+
+def test_render_empty():
+    assert ContextWindow().render() == ""
+
+
+def test_render_keeps_recent_detail():
+    window = ContextWindow(token_budget=200)
+    window.add(1, "a gold ring", 40, "Prongs are blurry. Lighting is harsh. Background is fine.")
+    window.add(2, "a gold ring, sharp prongs", 70, "Better focus.")
+
+    lines = window.render().splitlines()
+
+    assert lines[0] == "Best so far: iteration 2 scored 70."
+    assert lines[1] == (
+        "- Iteration 1 (score 40): prompt: a gold ring | "
+        "feedback: Prongs are blurry. Lighting is harsh."
+    )
+    assert lines[2].startswith("- Iteration 2 (score 70): prompt: a gold ring, sharp prongs")
+
+
+def test_render_stays_within_budget_as_history_grows():
+    window = ContextWindow(token_budget=150)
+    for i in range(1, 51):
+        window.add(i, "word " * 200, i, "Feedback sentence. " * 20)
+
+    text = window.render()
+
+    assert context_window.estimate_tokens(text) <= 160
+    assert "- Iteration 50 (score 50)" in text
+    assert "earlier iteration(s) omitted" in text.splitlines()[1]
@@ -0,0 +1,46 @@
+import pytest
+from PIL import Image
+
+from agentic_image_gen import derivatives
+from agentic_image_gen.derivatives import DerivativeSpec
+
+
+def test_parse_spec():
+    assert DerivativeSpec.parse("1536x1024:jpg:crop") == DerivativeSpec(1536, 1024, "jpeg", "crop")
+    assert DerivativeSpec.parse("256x256") == DerivativeSpec(256, 256, "png", "fit")
+    spec = DerivativeSpec.parse("300x200:webp:pad:#ffffff")
+    assert spec.background == "#ffffff"
+    assert spec.name == "300x200:webp:pad:#ffffff"
+    with pytest.raises(ValueError):
+        DerivativeSpec.parse("big:png")
+    with pytest.raises(ValueError):
+        DerivativeSpec.parse("100x100:gif")
+    with pytest.raises(ValueError):
+        DerivativeSpec.parse("100x100:png:fit:white")
+
+
+@pytest.mark.asyncio
+async def test_render_derivatives(tmp_path):
+    source = tmp_path / "best.png"
+    img = Image.new("RGBA", (400, 400), (0, 0, 0, 0))
+    img.paste((200, 0, 0, 255), (300, 150, 380, 250))
+    img.save(source)
+    specs = [
+        DerivativeSpec(200, 100, "jpeg", "crop"),
+        DerivativeSpec(100, 50, "png", "fit"),
+        DerivativeSpec(100, 50, "webp", "pad"),
+    ]
+
+    paths = await derivatives.render_derivatives(str(source), specs)
+
+    assert set(paths) == {spec.name for spec in specs}
+    with Image.open(paths["200x100:jpeg:crop"]) as cropped:
+        assert cropped.format == "JPEG"
+        assert cropped.size == (200, 100)
+        assert cropped.getpixel((170, 50))[0] > 150
+    with Image.open(paths["100x50:png:fit"]) as fitted:
+        assert fitted.size == (50, 50)
+        assert fitted.mode == "RGBA"
+    with Image.open(paths["100x50:webp:pad"]) as padded:
+        assert padded.format == "WEBP"
+        assert padded.size == (100, 50)
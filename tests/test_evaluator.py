@@ -1,7 +1,10 @@
+import base64
+import io
 import json
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
+from PIL import Image
 
 from agentic_image_gen import evaluator
 
@@ -24,6 +27,20 @@ async def test_evaluate_image_file(monkeypatch, tmp_path):
     assert result == {"score": 95, "feedback": "good"}
 
 
+@pytest.mark.anyio("asyncio")
+async def test_evaluate_image_api_error_returns_zero_score(monkeypatch, tmp_path):
+    img_file = tmp_path / "img.png"
+    img_file.write_bytes(b"data")
+    mock_client = MagicMock()
+    mock_client.chat.completions.create = AsyncMock(side_effect=RuntimeError("rate limited"))
+    monkeypatch.setattr(evaluator, "AsyncOpenAI", MagicMock(return_value=mock_client))
+
+    result = await evaluator.evaluate_image(str(img_file), "prompt")
+
+    assert result["score"] == 0
+    assert "rate limited" in result["feedback"]
+
+
 def test_parse_json_response_variants():
     cases = [
         '```json\n{"score": 88, "feedback": "ok"}\n```',
@@ -34,3 +51,113 @@ def test_parse_json_response_variants():
         parsed = evaluator._parse_json_response(text)
         assert parsed["score"]
         assert parsed["feedback"]
+
+
+def _mock_client(monkeypatch):
+    mock_client = MagicMock()
+    mock_response = MagicMock()
+    mock_response.choices = [
+        MagicMock(message=MagicMock(content=json.dumps({"score": 80, "feedback": "ok"})))
+    ]
+    mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
+    monkeypatch.setattr(evaluator, "AsyncOpenAI", MagicMock(return_value=mock_client))
+    return mock_client
+
+
+@pytest.mark.anyio("asyncio")
+async def test_evaluate_image_low_crop_fidelity(monkeypatch, tmp_path):
+    img_file = tmp_path / "ring.png"
+    img = Image.new("RGBA", (1024, 1024), (0, 0, 0, 0))
+    img.paste((200, 170, 40, 255), (400, 450, 560, 600))
+    img.save(img_file)
+    mock_client = _mock_client(monkeypatch)
+
+    result = await evaluator.evaluate_image(str(img_file), "prompt", fidelity="low_crop")
+
+    assert result == {"score": 80, "feedback": "ok"}
+    content = mock_client.chat.completions.create.await_args.kwargs["messages"][1]["content"]
+    global_view, caption, crop = content[1], content[2], content[3]
+    assert global_view["image_url"]["detail"] == "low"
+    assert global_view["image_url"]["url"].startswith("data:image/jpeg;base64,")
+    assert caption["text"] == evaluator.CROP_CAPTION
+    assert crop["image_url"]["detail"] == "high"
+    crop_bytes = base64.b64decode(crop["image_url"]["url"].split(",", 1)[1])
+    assert Image.open(io.BytesIO(crop_bytes)).size == (176, 166)
+
+
+@pytest.mark.anyio("asyncio")
+async def test_evaluate_image_low_fidelity_falls_back_for_undecodable_file(monkeypatch, tmp_path):
+    img_file = tmp_path / "img.png"
+    img_file.write_bytes(b"data")
+    mock_client = _mock_client(monkeypatch)
+
+    await evaluator.evaluate_image(str(img_file), "prompt", fidelity="low")
+
+    content = mock_client.chat.completions.create.await_args.kwargs["messages"][1]["content"]
+    assert content[1] == {
+        "type": "image_url",
+        "image_url": {"url": "data:image/png;base64," + base64.b64encode(b"data").decode()},
+    }
+
+
+def _chat_response(payload):
+    response = MagicMock()
+    response.choices = [MagicMock(message=MagicMock(content=json.dumps(payload)))]
+    return response
+
+
+def _patch_cascade_client(monkeypatch, first_pass, full=None):
+    responses = {
+        evaluator.FIRST_PASS_MODEL: _chat_response(first_pass),
+        "gpt-4o": _chat_response(full or {"score": 0, "feedback": "unused"}),
+    }
+    mock_client = MagicMock()
+    mock_client.chat.completions.create = AsyncMock(
+        side_effect=lambda **kwargs: responses[kwargs["model"]]
+    )
+    monkeypatch.setattr(evaluator, "AsyncOpenAI", MagicMock(return_value=mock_client))
+    return mock_client.chat.completions.create
+
+
+@pytest.mark.anyio("asyncio")
+async def test_cascade_trusts_confident_score_far_from_threshold(monkeypatch):
+    create = _patch_cascade_client(
+        monkeypatch, {"score": 40, "confidence": 0.9, "feedback": "wrong stone"}
+    )
+    policy = evaluator.CascadePolicy(threshold=95, margin=15)
+
+    result = await evaluator.evaluate_image("https://example.com/img.png", "prompt", cascade=policy)
+
+    assert result["score"] == 40
+    assert result["feedback"] == "wrong stone"
+    assert result["cascade"]["escalated"] is False
+    assert [call.kwargs["model"] for call in create.await_args_list] == [evaluator.FIRST_PASS_MODEL]
+
+
+@pytest.mark.anyio("asyncio")
+@pytest.mark.parametrize(
+    "first_pass, reason",
+    [
+        ({"score": 88, "confidence": 0.9, "feedback": "close"}, "margin"),
+        ({"score": 40, "confidence": 0.3, "feedback": "unsure"}, "uncertain"),
+        ({"feedback": "no score"}, "error"),
+    ],
+)
+async def test_cascade_escalates_to_full_evaluation(monkeypatch, first_pass, reason):
+    create = _patch_cascade_client(monkeypatch, first_pass, {"score": 96, "feedback": "great"})
+    agreement = evaluator.metrics.EVALUATION_CASCADE_AGREEMENT.labels(agree="false")
+    before = agreement.value
+    policy = evaluator.CascadePolicy(threshold=95, margin=15)
+
+    result = await evaluator.evaluate_image("https://example.com/img.png", "prompt", cascade=policy)
+
+    assert result["score"] == 96
+    assert result["feedback"] == "great"
+    assert result["cascade"]["escalated"] is True
+    assert result["cascade"]["reason"] == reason
+    assert [call.kwargs["model"] for call in create.await_args_list] == [
+        evaluator.FIRST_PASS_MODEL,
+        "gpt-4o",
+    ]
+    # The first pass scored below the threshold and the full evaluation above it.
+    assert agreement.value == before + (0 if reason == "error" else 1)
@@ -0,0 +1,63 @@
+import os
+import time
+from unittest.mock import AsyncMock
+
+import pytest
+
+from agentic_image_gen import generation_cache
+
+
+def test_compute_key_depends_on_reference_content(tmp_path):
+    ref = tmp_path / "ref.png"
+    ref.write_bytes(b"first")
+    params = {"quality": "high", "size": "1024x1024"}
+    key_a = generation_cache.compute_key("a ring", [str(ref)], params)
+
+    assert generation_cache.compute_key("a ring", [str(ref)], dict(params)) == key_a
+    assert generation_cache.compute_key("a ring", [str(ref)], {**params, "quality": "low"}) != key_a
+    ref.write_bytes(b"second")
+    assert generation_cache.compute_key("a ring", [str(ref)], params) != key_a
+
+
+@pytest.mark.asyncio
+async def test_generate_image_hit_skips_api(tmp_path, monkeypatch):
+    generated = tmp_path / "generated.png"
+    generated.write_bytes(b"image bytes")
+    mock_generate = AsyncMock(return_value={"image_path": str(generated), "response_id": "resp_1"})
+    monkeypatch.setattr(generation_cache.image_gen, "generate_image", mock_generate)
+    cache = generation_cache.GenerationCache(tmp_path / "cache")
+
+    first = await cache.generate_image(prompt="a ring", quality="high", hedge=False)
+    second = await cache.generate_image(prompt="a ring", quality="high", hedge=True)
+
+    assert mock_generate.await_count == 1
+    assert first == {"image_path": str(generated), "response_id": "resp_1"}
+    assert second["response_id"] == "resp_1"
+    assert second["image_path"] != str(generated)
+    with open(second["image_path"], "rb") as f:
+        assert f.read() == b"image bytes"
+
+    await cache.generate_image(prompt="a ring", quality="low")
+    assert mock_generate.await_count == 2
+
+
+def test_evict_removes_least_recently_used(tmp_path):
+    cache = generation_cache.GenerationCache(tmp_path / "cache", max_bytes=10_000)
+    for name in ("a", "b", "c"):
+        image = tmp_path / f"{name}.png"
+        image.write_bytes(b"x" * 3000)
+        cache.put(name, str(image), f"resp_{name}")
+    now = time.time()
+    os.utime(cache._meta_path("a"), (now - 30, now - 30))
+    os.utime(cache._meta_path("b"), (now - 20, now - 20))
+    os.utime(cache._meta_path("c"), (now - 10, now - 10))
+    assert cache.get("a") is not None
+
+    image = tmp_path / "d.png"
+    image.write_bytes(b"x" * 3000)
+    cache.put("d", str(image), "resp_d")
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.get("d") is not None
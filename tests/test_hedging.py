@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from agentic_image_gen import hedging
+
+
+def _hedger(**policy):
+    return hedging.Hedger("test", hedging.HedgePolicy(min_samples=1, **policy))
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_and_cancelled():
+    hedger = _hedger(max_hedge_fraction=1.0)
+    hedger.latencies.append(0.01)
+    delays = [5.0, 0.0]
+    cancelled = []
+
+    async def call():
+        delay = delays.pop(0)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(delay)
+            raise
+        return delay
+
+    result = await hedger.run(call)
+
+    assert result == 0.0
+    assert hedger.hedges == 1
+    await asyncio.sleep(0)
+    assert cancelled == [5.0]
+
+
+@pytest.mark.asyncio
+async def test_failed_hedge_falls_back_to_primary():
+    hedger = _hedger(max_hedge_fraction=1.0)
+    hedger.latencies.append(0.01)
+    attempts = []
+
+    async def call():
+        attempts.append(len(attempts))
+        if len(attempts) == 2:
+            raise RuntimeError("hedge failed")
+        await asyncio.sleep(0.05)
+        return "primary"
+
+    assert await hedger.run(call) == "primary"
+    assert len(attempts) == 2
+
+
+@pytest.mark.asyncio
+async def test_hedges_are_capped_and_opt_in():
+    hedger = hedging.Hedger(
+        "test", hedging.HedgePolicy(max_hedge_fraction=0.5, min_samples=100, fallback_delay=0.001)
+    )
+    launched = []
+
+    async def call():
+        launched.append(1)
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    await hedger.run(call, enabled=False)
+    assert len(launched) == 1
+
+    for _ in range(3):
+        await hedger.run(call)
+
+    assert hedger.calls == 4
+    assert hedger.hedges == 2
+
+
+@pytest.mark.asyncio
+async def test_hedged_wins_do_not_shrink_delay():
+    hedger = _hedger(max_hedge_fraction=1.0, window=20)
+    hedger.latencies.extend([0.02] * 20)
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        # Every primary stalls; every hedge answers at once.
+        await asyncio.sleep(1.0 if len(attempts) % 2 else 0.0)
+        return "ok"
+
+    for _ in range(25):
+        await hedger.run(call)
+
+    assert hedger.hedges == 25
+    # Timers may fire a clock tick early, hence the small tolerance.
+    assert hedger.delay() >= 0.015
+    assert min(hedger.latencies) >= 0.015
+
+
+def test_delay_uses_quantile_after_warmup():
+    hedger = hedging.Hedger("test", hedging.HedgePolicy(min_samples=10, fallback_delay=7.0))
+    assert hedger.delay() == 7.0
+
+    hedger.latencies.extend(float(i) for i in range(1, 11))
+
+    assert hedger.delay() == 10.0
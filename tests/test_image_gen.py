@@ -1,6 +1,11 @@
+import asyncio
+import base64
+from pathlib import Path
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
+from aiohttp import web
+from PIL import Image
 
 from agentic_image_gen import image_gen
 
@@ -16,3 +21,226 @@ async def test_generate_image(monkeypatch):
     result = await image_gen.generate_image("prompt")
 
     assert result == "img.png"
+
+
+def _write_edit_inputs(tmp_path):
+    image_path = tmp_path / "ring.png"
+    Image.new("RGB", (1000, 800), (10, 20, 30)).save(image_path)
+    mask_path = tmp_path / "mask.png"
+    mask = Image.new("RGBA", (1000, 800), (0, 0, 0, 255))
+    mask.paste((0, 0, 0, 0), (400, 300, 480, 380))
+    mask.save(mask_path)
+    return str(image_path), str(mask_path)
+
+
+@pytest.mark.anyio("asyncio")
+async def test_edit_image_region_only_crops_and_composites(monkeypatch, tmp_path):
+    image_path, mask_path = _write_edit_inputs(tmp_path)
+    sent = {}
+
+    async def fake_generate_image(**kwargs):
+        with Image.open(kwargs["reference_images"][0]) as crop:
+            sent["crop_size"] = crop.size
+        with Image.open(kwargs["mask_image"]) as mask_crop:
+            sent["mask_size"] = mask_crop.size
+        sent["size"] = kwargs["size"]
+        edited = tmp_path / "edited.png"
+        Image.new("RGB", (1024, 1024), (255, 0, 0)).save(edited)
+        return {"image_path": str(edited), "response_id": "rid1"}
+
+    monkeypatch.setattr(image_gen, "generate_image", fake_generate_image)
+
+    result = await image_gen.edit_image("ruby", image_path, mask_path, region_only=True)
+
+    assert result["response_id"] == "rid1"
+    assert sent == {"crop_size": (120, 120), "mask_size": (120, 120), "size": "1024x1024"}
+    with Image.open(result["image_path"]) as composite:
+        assert composite.size == (1000, 800)
+        assert composite.getpixel((440, 340))[:3] == (255, 0, 0)
+        assert composite.getpixel((100, 100))[:3] == (10, 20, 30)
+        assert composite.getpixel((385, 340))[:3] == (10, 20, 30)
+    assert not (tmp_path / "edited.png").exists()
+
+
+@pytest.mark.anyio("asyncio")
+async def test_edit_image_region_only_matches_generation_aspect(monkeypatch, tmp_path):
+    image_path = tmp_path / "ring.png"
+    Image.new("RGB", (2000, 2000), (10, 20, 30)).save(image_path)
+    mask_path = tmp_path / "mask.png"
+    mask = Image.new("RGBA", (2000, 2000), (0, 0, 0, 255))
+    mask.paste((0, 0, 0, 0), (800, 900, 1040, 1100))
+    mask.save(mask_path)
+    sent = {}
+
+    async def fake_generate_image(**kwargs):
+        with Image.open(kwargs["reference_images"][0]) as crop:
+            sent["crop_size"] = crop.size
+        sent["size"] = kwargs["size"]
+        # Left half red, right half blue: a uniform resize keeps the split centred.
+        edited = Image.new("RGB", (1024, 1024), (0, 0, 255))
+        edited.paste((255, 0, 0), (0, 0, 512, 1024))
+        edited_path = tmp_path / "edited.png"
+        edited.save(edited_path)
+        return {"image_path": str(edited_path), "response_id": "rid1"}
+
+    monkeypatch.setattr(image_gen, "generate_image", fake_generate_image)
+
+    result = await image_gen.edit_image("ruby", str(image_path), str(mask_path), region_only=True)
+
+    # A 240x200 mask pads to 360x320 and is grown to 360x360 for a square generation.
+    assert sent == {"crop_size": (360, 360), "size": "1024x1024"}
+    with Image.open(result["image_path"]) as composite:
+        assert composite.getpixel((915, 1000))[:3] == (255, 0, 0)
+        assert composite.getpixel((925, 1000))[:3] == (0, 0, 255)
+
+
+@pytest.mark.anyio("asyncio")
+async def test_edit_image_region_only_falls_back_for_large_mask(monkeypatch, tmp_path):
+    image_path, _ = _write_edit_inputs(tmp_path)
+    mask_path = tmp_path / "full_mask.png"
+    Image.new("RGBA", (1000, 800), (0, 0, 0, 0)).save(mask_path)
+    generate_mock = AsyncMock(return_value={"image_path": "out.png", "response_id": "rid"})
+    monkeypatch.setattr(image_gen, "generate_image", generate_mock)
+
+    result = await image_gen.edit_image("ruby", image_path, str(mask_path), region_only=True)
+
+    assert result == {"image_path": "out.png", "response_id": "rid"}
+    assert generate_mock.await_args.kwargs["reference_images"] == [image_path]
+
+
+@pytest.mark.anyio("asyncio")
+async def test_prepare_references_uploads_concurrently(monkeypatch, tmp_path):
+    in_flight = []
+    peak = []
+
+    async def fake_upload(client, file_path):
+        in_flight.append(file_path)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.remove(file_path)
+        return f"file-{Path(file_path).stem}"
+
+    monkeypatch.setattr(image_gen, "_create_file_from_path", fake_upload)
+    paths = [str(tmp_path / f"ref{i}.png") for i in range(3)]
+
+    items = await image_gen._prepare_references(MagicMock(), paths, use_file_ids=True)
+
+    assert items == [{"type": "input_image", "file_id": f"file-ref{i}"} for i in range(3)]
+    assert max(peak) == 3
+
+
+@pytest.mark.anyio("asyncio")
+async def test_fetch_enforces_max_bytes(monkeypatch):
+    async def handler(request):
+        name = request.match_info["name"]
+        body = b"x" * (200 if name == "big" else 50)
+        return web.Response(body=body, content_type="image/png")
+
+    app = web.Application()
+    app.router.add_get("/{name}.png", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    monkeypatch.setattr(image_gen, "REFERENCE_MAX_BYTES", 100)
+
+    try:
+        async with image_gen._create_reference_session() as session:
+            small = await image_gen._fetch_and_encode_image(session, f"http://127.0.0.1:{port}/small.png")
+            big = await image_gen._fetch_and_encode_image(session, f"http://127.0.0.1:{port}/big.png")
+    finally:
+        await runner.cleanup()
+
+    assert small == "data:image/png;base64," + base64.b64encode(b"x" * 50).decode()
+    assert big is None
+
+
+@pytest.mark.anyio("asyncio")
+async def test_generate_image_background_mode_uses_poller(monkeypatch):
+    image_b64 = base64.b64encode(b"png bytes").decode()
+    completed = MagicMock(id="resp_1", status="completed")
+    completed.output = [MagicMock(type="image_generation_call", result=image_b64)]
+    mock_client = MagicMock()
+    mock_client.responses.create = AsyncMock(return_value=MagicMock(id="resp_1", status="queued"))
+    monkeypatch.setattr(image_gen, "AsyncOpenAI", MagicMock(return_value=mock_client))
+    poller = MagicMock()
+    poller.wait = AsyncMock(return_value=completed)
+    monkeypatch.setattr(image_gen.response_poller, "get_poller", lambda: poller)
+
+    result = await image_gen.generate_image("a ring", background_mode=True)
+
+    assert mock_client.responses.create.await_args.kwargs["background"] is True
+    poller.wait.assert_awaited_once_with("resp_1")
+    assert result["response_id"] == "resp_1"
+    assert Path(result["image_path"]).read_bytes() == b"png bytes"
+
+
+@pytest.mark.anyio("asyncio")
+async def test_resume_generation_keeps_response_id_on_timeout(monkeypatch):
+    poller = MagicMock()
+    poller.wait = AsyncMock(side_effect=asyncio.TimeoutError())
+    monkeypatch.setattr(image_gen.response_poller, "get_poller", lambda: poller)
+
+    result = await image_gen.resume_generation("resp_1", timeout=1)
+
+    assert result == {"image_path": "", "response_id": "resp_1"}
+
+
+@pytest.mark.anyio("asyncio")
+async def test_generate_image_packs_secondary_references(monkeypatch, tmp_path):
+    refs = []
+    for i, color in enumerate([(255, 0, 0), (0, 255, 0), (0, 0, 255)]):
+        path = tmp_path / f"ref{i}.png"
+        Image.new("RGB", (64, 64), color).save(path)
+        refs.append(str(path))
+    monkeypatch.setattr(image_gen.contact_sheet, "DEFAULT_CACHE_DIR", tmp_path / "sheets")
+    mock_client = MagicMock()
+    mock_client.responses.create = AsyncMock(return_value=MagicMock(id="resp_1", output=[]))
+    monkeypatch.setattr(image_gen, "AsyncOpenAI", MagicMock(return_value=mock_client))
+
+    await image_gen.generate_image("a ring", reference_images=refs, pack_references=True)
+    await image_gen.generate_image("a ring", reference_images=refs, pack_references=True)
+
+    content = mock_client.responses.create.await_args.kwargs["input"][0]["content"]
+    assert [item["type"] for item in content] == ["input_text", "input_image", "input_image", "input_text"]
+    assert "contact sheet of 2" in content[-1]["text"]
+    sheets = list((tmp_path / "sheets").glob("*.jpeg"))
+    assert len(sheets) == 1
+    with Image.open(sheets[0]) as sheet:
+        assert sheet.width == 2 * image_gen.contact_sheet.TILE_SIZE
+
+
+@pytest.mark.anyio("asyncio")
+async def test_partial_reference_sheet_is_deleted(monkeypatch, tmp_path):
+    refs = [str(tmp_path / "missing.png")]
+    for i in range(3):
+        path = tmp_path / f"ref{i}.png"
+        Image.new("RGB", (64, 64), (i * 80, 0, 0)).save(path)
+        refs.append(str(path))
+    sheet_path = tmp_path / "partial_sheet.jpeg"
+    monkeypatch.setattr(image_gen.contact_sheet, "DEFAULT_CACHE_DIR", tmp_path / "sheets")
+    monkeypatch.setattr(image_gen, "_temp_image_path", lambda prefix, fmt: str(sheet_path))
+    mock_client = MagicMock()
+    mock_client.responses.create = AsyncMock(return_value=MagicMock(id="resp_1", output=[]))
+    monkeypatch.setattr(image_gen, "AsyncOpenAI", MagicMock(return_value=mock_client))
+
+    await image_gen.generate_image(
+        "a ring", reference_images=[refs[1], refs[0], refs[2], refs[3]], pack_references=True
+    )
+
+    content = mock_client.responses.create.await_args.kwargs["input"][0]["content"]
+    assert "contact sheet of 2" in content[-1]["text"]
+    assert not sheet_path.exists()
+    assert not list((tmp_path / "sheets").glob("*.jpeg"))
+
+
+@pytest.mark.asyncio
+async def test_reference_session_is_shared_per_event_loop():
+    first = image_gen.get_reference_session()
+    assert image_gen.get_reference_session() is first
+    await image_gen.close_reference_session()
+    assert first.closed
+    second = image_gen.get_reference_session()
+    assert second is not first
+    await image_gen.close_reference_session()
@@ -0,0 +1,46 @@
+import numpy as np
+from PIL import Image
+
+from agentic_image_gen import image_hash
+
+
+def _gradient_image(path, flip=False):
+    row = np.linspace(0, 255, 64, dtype=np.uint8)
+    pixels = np.tile(row[::-1] if flip else row, (64, 1))
+    Image.fromarray(pixels, mode="L").save(path)
+    return str(path)
+
+
+def test_compute_dhash_near_duplicates(tmp_path):
+    first = _gradient_image(tmp_path / "a.png")
+    Image.open(first).convert("RGB").save(tmp_path / "b.jpg", quality=90)
+    flipped = _gradient_image(tmp_path / "c.png", flip=True)
+
+    hash_a = image_hash.compute_dhash(first)
+    hash_b = image_hash.compute_dhash(str(tmp_path / "b.jpg"))
+    hash_c = image_hash.compute_dhash(flipped)
+
+    assert image_hash.hamming_distance(hash_a, hash_b) <= 4
+    assert image_hash.hamming_distance(hash_a, hash_c) > 32
+
+
+def test_compute_dhash_missing_file(tmp_path):
+    assert image_hash.compute_dhash(str(tmp_path / "missing.png")) is None
+
+
+def test_find_near_duplicate():
+    assert image_hash.find_near_duplicate(0b1011, [None, 0b0000, 0b1010], 2) == 2
+    assert image_hash.find_near_duplicate(0b1111, [0b0000], 2) is None
+    assert image_hash.find_near_duplicate(None, [0b0000], 2) is None
+
+
+def test_pixel_difference_flags_local_changes(tmp_path):
+    first = _gradient_image(tmp_path / "a.png")
+    Image.open(first).convert("RGB").save(tmp_path / "b.jpg", quality=90)
+    patched = Image.open(first).convert("RGB")
+    patched.paste((255, 0, 0), (8, 8, 16, 16))
+    patched.save(tmp_path / "c.png")
+
+    assert image_hash.pixel_difference(first, str(tmp_path / "b.jpg")) < 2
+    assert image_hash.pixel_difference(first, str(tmp_path / "c.png")) > 20
+    assert image_hash.pixel_difference(first, str(tmp_path / "missing.png")) is None
@@ -0,0 +1,40 @@
+from PIL import Image
+
+from agentic_image_gen import image_processing
+
+
+def test_product_bounding_box_from_alpha():
+    img = Image.new("RGBA", (200, 100), (0, 0, 0, 0))
+    img.paste((255, 0, 0, 255), (50, 20, 70, 40))
+
+    assert image_processing.product_bounding_box(img, padding=0) == (50, 20, 70, 40)
+    assert image_processing.product_bounding_box(img, padding=0.5) == (40, 10, 80, 50)
+
+
+def test_product_bounding_box_from_opaque_background():
+    img = Image.new("RGB", (100, 100), (250, 250, 250))
+    img.paste((30, 30, 30), (10, 60, 30, 90))
+
+    assert image_processing.product_bounding_box(img, padding=0) == (10, 60, 30, 90)
+
+
+def test_product_bounding_box_empty_image():
+    assert image_processing.product_bounding_box(Image.new("RGB", (10, 10), "white")) is None
+
+
+def test_flatten_and_downscale():
+    img = Image.new("RGBA", (400, 200), (0, 0, 0, 0))
+
+    flat = image_processing.flatten_onto_background(img)
+
+    assert flat.mode == "RGB"
+    assert flat.getpixel((0, 0)) == (255, 255, 255)
+    assert image_processing.downscale(flat, 100).size == (100, 50)
+
+
+def test_fit_box_to_aspect_grows_and_stays_inside_image():
+    assert image_processing.fit_box_to_aspect((740, 840, 1100, 1160), (2000, 2000), 1.0) == (
+        740, 820, 1100, 1180
+    )
+    # Grown past the left edge, the box shifts right instead of being cut.
+    assert image_processing.fit_box_to_aspect((0, 0, 100, 200), (1000, 1000), 1.5) == (0, 0, 300, 200)
@@ -1,6 +1,7 @@
 from unittest.mock import AsyncMock
 
 import pytest
+from PIL import Image, ImageDraw
 
 from agentic_image_gen import loop_controller
 
@@ -77,3 +78,232 @@ async def test_history_tracking(monkeypatch):
     ]
     assert prompter_mock.await_count == 2
     assert run_mock.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_near_duplicate_reuses_score(monkeypatch):
+    monkeypatch.setattr(loop_controller, "MAX_ITERATIONS", 2)
+    monkeypatch.setattr(
+        loop_controller.thread_manager, "create_thread", AsyncMock(return_value="t1")
+    )
+    monkeypatch.setattr(loop_controller.assistant_manager, "load_assistant_id", lambda: "a1")
+    monkeypatch.setattr(loop_controller.run_orchestrator, "run_and_stream", AsyncMock())
+    monkeypatch.setattr(
+        loop_controller.image_gen,
+        "generate_image",
+        AsyncMock(side_effect=[
+            {"image_path": "img1", "response_id": "rid1"},
+            {"image_path": "img2", "response_id": "rid2"},
+        ]),
+    )
+    monkeypatch.setattr(
+        loop_controller.image_hash, "compute_dhash", {"img1": 0b1010, "img2": 0b1011}.get
+    )
+    monkeypatch.setattr(loop_controller.image_hash, "pixel_difference", lambda a, b: 0.5)
+    evaluate_mock = AsyncMock(return_value={"score": 40, "feedback": "fb1"})
+    monkeypatch.setattr(loop_controller.evaluator, "evaluate_image", evaluate_mock)
+    prompter_mock = AsyncMock(side_effect=["p2", "p3"])
+    monkeypatch.setattr(loop_controller.prompter, "generate_prompt", prompter_mock)
+
+    result = await loop_controller.run_image_generation_loop("start", None, "high", "1024x1024", "transparent", "png")
+
+    assert evaluate_mock.await_count == 1
+    assert result["best_image_url"] == "img1"
+    duplicate_entry = result["full_history"][1]
+    assert duplicate_entry["score"] == 40
+    assert duplicate_entry["evaluator_query"] == "fb1"
+    assert duplicate_entry["duplicate_of"] == 0
+    assert "score reused" in duplicate_entry["note"]
+    duplicate_feedback = prompter_mock.await_args_list[1].args[1]
+    assert duplicate_feedback.startswith("No change produced")
+    assert "fb1" in duplicate_feedback
+
+
+@pytest.mark.asyncio
+async def test_small_detail_change_is_still_evaluated(monkeypatch, tmp_path):
+    def ring(name, stone):
+        img = Image.new("RGB", (512, 512), (255, 255, 255))
+        draw = ImageDraw.Draw(img)
+        draw.ellipse((156, 176, 356, 376), outline=(200, 170, 60), width=18)
+        draw.ellipse((226, 120, 286, 180), fill=stone)
+        img.save(tmp_path / name)
+        return str(tmp_path / name)
+
+    red, blue = ring("red.png", (220, 30, 30)), ring("blue.png", (30, 60, 220))
+    monkeypatch.setattr(loop_controller, "MAX_ITERATIONS", 2)
+    monkeypatch.setattr(
+        loop_controller.thread_manager, "create_thread", AsyncMock(return_value="t1")
+    )
+    monkeypatch.setattr(loop_controller.assistant_manager, "load_assistant_id", lambda: "a1")
+    monkeypatch.setattr(loop_controller.run_orchestrator, "run_and_stream", AsyncMock())
+    monkeypatch.setattr(
+        loop_controller.image_gen,
+        "generate_image",
+        AsyncMock(side_effect=[
+            {"image_path": red, "response_id": "rid1"},
+            {"image_path": blue, "response_id": "rid2"},
+        ]),
+    )
+    evaluate_mock = AsyncMock(side_effect=[
+        {"score": 40, "feedback": "stone should be blue"},
+        {"score": 97, "feedback": "good"},
+    ])
+    monkeypatch.setattr(loop_controller.evaluator, "evaluate_image", evaluate_mock)
+    monkeypatch.setattr(loop_controller.prompter, "generate_prompt", AsyncMock(return_value="p2"))
+
+    result = await loop_controller.run_image_generation_loop(
+        "start", None, "high", "1024x1024", "transparent", "png"
+    )
+
+    first_hash = loop_controller.image_hash.compute_dhash(red)
+    second_hash = loop_controller.image_hash.compute_dhash(blue)
+    assert loop_controller.image_hash.hamming_distance(first_hash, second_hash) <= (
+        loop_controller.DUPLICATE_HASH_DISTANCE
+    )
+    assert evaluate_mock.await_count == 2
+    assert "duplicate_of" not in result["full_history"][1]
+    assert result["final_score"] == 97
+
+
+def _patch_single_iteration(monkeypatch, score):
+    monkeypatch.setattr(
+        loop_controller.thread_manager, "create_thread", AsyncMock(return_value="t1")
+    )
+    monkeypatch.setattr(loop_controller.assistant_manager, "load_assistant_id", lambda: "a1")
+    monkeypatch.setattr(loop_controller.run_orchestrator, "run_and_stream", AsyncMock())
+    monkeypatch.setattr(
+        loop_controller.image_gen,
+        "generate_image",
+        AsyncMock(return_value={"image_path": "img1", "response_id": "rid1"}),
+    )
+    evaluate_mock = AsyncMock(return_value={"score": score, "feedback": "fb1"})
+    monkeypatch.setattr(loop_controller.evaluator, "evaluate_image", evaluate_mock)
+    monkeypatch.setattr(
+        loop_controller.prompter, "generate_prompt", AsyncMock(return_value="p2")
+    )
+    return evaluate_mock
+
+
+@pytest.mark.asyncio
+async def test_iterate_yields_events_in_order(monkeypatch):
+    _patch_single_iteration(monkeypatch, 40)
+
+    events = [
+        event
+        async for event in loop_controller.iterate_image_generation_loop(
+            "start", None, "high", "1024x1024", "transparent", "png"
+        )
+    ]
+
+    assert [event.event for event in events] == [
+        "generation_started",
+        "generation_finished",
+        "evaluation_result",
+        "prompt_refined",
+        "final",
+    ]
+    assert events[2].to_dict() == {
+        "event": "evaluation_result",
+        "iteration": 1,
+        "image_path": "img1",
+        "score": 40,
+        "feedback": "fb1",
+        "duplicate_of": None,
+    }
+    assert events[3].prompt == "p2"
+    assert events[-1].result["best_image_url"] == "img1"
+
+
+@pytest.mark.asyncio
+async def test_iterate_stops_when_closed(monkeypatch):
+    evaluate_mock = _patch_single_iteration(monkeypatch, 40)
+
+    events = loop_controller.iterate_image_generation_loop(
+        "start", None, "high", "1024x1024", "transparent", "png"
+    )
+    async for event in events:
+        if event.event == "generation_finished":
+            break
+    await events.aclose()
+
+    evaluate_mock.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_derivatives_rendered_from_best_image(monkeypatch):
+    _patch_single_iteration(monkeypatch, 95)
+    render_mock = AsyncMock(return_value={"256x256:webp:fit": "/tmp/best_256x256_fit.webp"})
+    monkeypatch.setattr(loop_controller.derivatives_module, "render_derivatives", render_mock)
+    specs = [loop_controller.derivatives_module.DerivativeSpec(256, 256, "webp")]
+
+    result = await loop_controller.run_image_generation_loop(
+        "start", None, "high", "1024x1024", "transparent", "png", derivatives=specs
+    )
+
+    render_mock.assert_awaited_once_with("img1", specs)
+    assert result["derivatives"] == {"256x256:webp:fit": "/tmp/best_256x256_fit.webp"}
+
+
+@pytest.mark.asyncio
+async def test_prompt_index_warm_start_and_record(monkeypatch, tmp_path):
+    _patch_single_iteration(monkeypatch, 96)
+    generate_mock = loop_controller.image_gen.generate_image
+    index_path = tmp_path / "history.jsonl"
+    loop_controller.prompt_index.append_record(
+        index_path,
+        loop_controller.prompt_index.PromptRecord(
+            "diamond ring", "diamond ring, sharp focus on prongs", 97
+        ),
+    )
+
+    result = await loop_controller.run_image_generation_loop(
+        "diamond ring", None, "high", "1024x1024", "transparent", "png",
+        prompt_index_path=str(index_path),
+    )
+
+    assert generate_mock.await_args.kwargs["prompt"] == "diamond ring. sharp focus on prongs."
+    assert result["full_history"][0]["prompter_query"] == "diamond ring. sharp focus on prongs."
+    records = loop_controller.prompt_index.load_records(index_path)
+    assert records[-1] == loop_controller.prompt_index.PromptRecord(
+        "diamond ring", "diamond ring. sharp focus on prongs.", 96
+    )
+
+
+@pytest.mark.asyncio
+async def test_prompt_index_write_failure_keeps_result(monkeypatch, tmp_path, capsys):
+    _patch_single_iteration(monkeypatch, 96)
+
+    def fail(path, record):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(loop_controller.prompt_index, "append_record", fail)
+
+    result = await loop_controller.run_image_generation_loop(
+        "diamond ring", None, "high", "1024x1024", "transparent", "png",
+        prompt_index_path=str(tmp_path / "history.jsonl"),
+    )
+
+    assert result["final_score"] == 96
+    assert "Failed to record prompt history" in capsys.readouterr().err
+
+
+@pytest.mark.asyncio
+async def test_run_is_archived(monkeypatch, tmp_path):
+    _patch_single_iteration(monkeypatch, 96)
+    monkeypatch.setattr(loop_controller.image_hash, "compute_dhash", lambda path: 0xABC)
+    db = tmp_path / "archive.sqlite3"
+
+    await loop_controller.run_image_generation_loop(
+        "start", None, "high", "1024x1024", "transparent", "png",
+        archive_path=str(db), category="rings",
+    )
+
+    runs = loop_controller.run_archive.list_runs(db)
+    assert len(runs) == 1
+    assert runs[0]["category"] == "rings"
+    assert runs[0]["final_score"] == 96
+    assert runs[0]["threshold_met"] == 1
+    iterations = loop_controller.run_archive.get_iterations(db, runs[0]["id"])
+    assert iterations[0]["image_hash"] == "abc".zfill(64)
+    assert iterations[0]["response_id"] == "rid1"
+    assert iterations[0]["generation_seconds"] >= 0
@@ -1,5 +1,5 @@
 import asyncio
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock
 
 from agentic_image_gen import message_sender as ms
 
@@ -7,14 +7,14 @@ from agentic_image_gen import message_sender as ms
 def test_send_message(monkeypatch):
     fake_message = MagicMock(id="msg_123")
     fake_client = MagicMock()
-    fake_client.beta.threads.messages.create.return_value = fake_message
+    fake_client.beta.threads.messages.create = AsyncMock(return_value=fake_message)
 
-    monkeypatch.setattr(ms, "get_client", lambda: fake_client)
+    monkeypatch.setattr(ms, "get_async_client", lambda: fake_client)
 
     message_id = asyncio.run(ms.send_message("thread_1", "hello", ["img1", "img2"]))
 
     assert message_id == "msg_123"
-    fake_client.beta.threads.messages.create.assert_called_once_with(
+    fake_client.beta.threads.messages.create.assert_awaited_once_with(
         thread_id="thread_1",
         role="user",
         content="hello",
@@ -0,0 +1,68 @@
+import time
+
+import aiohttp
+import pytest
+
+from agentic_image_gen import metrics
+
+
+def test_counter_and_histogram_render():
+    registry = metrics.Registry()
+    calls = registry.counter("calls_total", "Calls.", ("stage",))
+    latency = registry.histogram("latency_seconds", "Latency.", buckets=(1, 5))
+
+    calls.labels(stage="gen").inc()
+    calls.labels(stage="gen").inc(2)
+    calls.labels(stage='say "hi"').inc()
+    latency.labels().observe(0.5)
+    latency.labels().observe(3)
+    latency.labels().observe(10)
+
+    assert registry.render().splitlines() == [
+        "# HELP calls_total Calls.",
+        "# TYPE calls_total counter",
+        'calls_total{stage="gen"} 3',
+        'calls_total{stage="say \\"hi\\""} 1',
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{le="1"} 1',
+        'latency_seconds_bucket{le="5"} 2',
+        'latency_seconds_bucket{le="+Inf"} 3',
+        "latency_seconds_sum 13.5",
+        "latency_seconds_count 3",
+    ]
+
+
+def test_record_call_and_textfile(tmp_path):
+    before = metrics.API_CALLS.labels(stage="test", outcome="failure").value
+
+    metrics.record_call("test", time.perf_counter(), success=False)
+
+    assert metrics.API_CALLS.labels(stage="test", outcome="failure").value == before + 1
+    out = tmp_path / "agentic.prom"
+    metrics.write_textfile(out)
+    text = out.read_text()
+    assert 'agentic_image_gen_api_calls_total{stage="test",outcome="failure"}' in text
+    assert 'agentic_image_gen_stage_duration_seconds_count{stage="test"}' in text
+    assert list(tmp_path.iterdir()) == [out]
+
+
+def test_metric_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        metrics._Metric("x", "X.")
+
+
+@pytest.mark.asyncio
+async def test_http_server_binds_loopback_by_default():
+    registry = metrics.Registry()
+    registry.counter("served_total", "Served.").labels().inc()
+
+    runner = await metrics.start_http_server(0, registry=registry)
+    try:
+        host, port = runner.addresses[0][:2]
+        assert host == "127.0.0.1"
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"http://{host}:{port}/metrics") as response:
+                assert "served_total 1" in await response.text()
+    finally:
+        await runner.cleanup()
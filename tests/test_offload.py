@@ -0,0 +1,47 @@
+import base64
+import threading
+
+import pytest
+
+from agentic_image_gen import offload
+
+
+@pytest.fixture(autouse=True)
+def reset_pools():
+    yield
+    offload.configure()
+
+
+def _thread_name():
+    return threading.current_thread().name
+
+
+@pytest.mark.asyncio
+async def test_run_cpu_respects_threshold():
+    offload.configure(threshold_bytes=100)
+
+    inline = await offload.run_cpu(_thread_name, size=10)
+    offloaded = await offload.run_cpu(_thread_name, size=1000)
+
+    assert inline == threading.current_thread().name
+    assert offloaded.startswith("offload")
+
+
+@pytest.mark.asyncio
+async def test_run_cpu_process_pool(tmp_path):
+    offload.configure(max_workers=1, use_processes=True, threshold_bytes=0)
+    path = tmp_path / "img.png"
+    path.write_bytes(b"\x89PNG")
+
+    data_url = await offload.run_cpu(offload.encode_file_data_url, str(path), "image/png", size=4)
+
+    assert data_url == "data:image/png;base64," + base64.b64encode(b"\x89PNG").decode()
+
+
+@pytest.mark.asyncio
+async def test_decode_to_file_roundtrip(tmp_path):
+    path = tmp_path / "out.png"
+
+    await offload.run_cpu(offload.decode_to_file, base64.b64encode(b"abc").decode(), str(path))
+
+    assert path.read_bytes() == b"abc"
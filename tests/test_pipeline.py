@@ -0,0 +1,103 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from agentic_image_gen import pipeline
+
+
+def _patch_common(monkeypatch, evaluate):
+    monkeypatch.setattr(pipeline.thread_manager, "create_thread", AsyncMock(return_value="t1"))
+    monkeypatch.setattr(pipeline.assistant_manager, "load_assistant_id", lambda: "a1")
+    monkeypatch.setattr(pipeline.run_orchestrator, "run_and_stream", AsyncMock())
+    monkeypatch.setattr(pipeline.loop_controller.image_hash, "compute_dhash", lambda path: None)
+    monkeypatch.setattr(pipeline.loop_controller.evaluator, "evaluate_image", evaluate)
+    monkeypatch.setattr(pipeline.loop_controller, "MAX_ITERATIONS", 3)
+
+
+@pytest.mark.asyncio
+async def test_pipeline_runs_jobs_through_stages(monkeypatch):
+    async def generate(prompt, **kwargs):
+        return {"image_path": f"{prompt}.png", "response_id": f"r-{prompt}"}
+
+    async def evaluate(image_path, prompt, **kwargs):
+        return {"score": 96 if prompt.endswith("+") else 40, "feedback": "more sparkle"}
+
+    _patch_common(monkeypatch, evaluate)
+    monkeypatch.setattr(pipeline.image_gen, "generate_image", generate)
+    prompter_mock = AsyncMock(side_effect=lambda prompt, feedback, history=None: prompt + "+")
+    monkeypatch.setattr(pipeline.prompter, "generate_prompt", prompter_mock)
+
+    async with pipeline.Pipeline("high", "1024x1024", "transparent", "png") as runner:
+        results = await asyncio.gather(*(runner.run(f"ring{i}") for i in range(5)))
+
+    for i, result in enumerate(results):
+        assert result["final_score"] == 96
+        assert result["best_image_url"] == f"ring{i}+.png"
+        assert [entry["score"] for entry in result["full_history"]] == [40, 96]
+    assert prompter_mock.await_count == 5
+    assert runner.queue_depths() == {"generate": 0, "evaluate": 0, "refine": 0}
+
+
+@pytest.mark.asyncio
+async def test_pipeline_limits_stage_concurrency_and_queues(monkeypatch):
+    active = {"generate": 0}
+    peak = {"generate": 0, "queue": 0}
+    release = asyncio.Event()
+
+    async def generate(prompt, **kwargs):
+        active["generate"] += 1
+        peak["generate"] = max(peak["generate"], active["generate"])
+        await release.wait()
+        active["generate"] -= 1
+        return {"image_path": f"{prompt}.png", "response_id": "r"}
+
+    _patch_common(monkeypatch, AsyncMock(return_value={"score": 99, "feedback": "ok"}))
+    monkeypatch.setattr(pipeline.image_gen, "generate_image", generate)
+
+    stages = {"generate": pipeline.StageConfig(workers=2, queue_size=2)}
+    async with pipeline.Pipeline(
+        "high", "1024x1024", "transparent", "png", stages=stages, max_in_flight=4
+    ) as runner:
+        futures = [await runner.submit(f"ring{i}") for i in range(4)]
+        blocked = asyncio.create_task(runner.submit("ring4"))
+        await asyncio.sleep(0.01)
+        peak["queue"] = runner.queue_depths()["generate"]
+        assert not blocked.done()
+        assert runner.busy_workers()["generate"] == 2
+
+        release.set()
+        futures.append(await blocked)
+        results = await asyncio.gather(*futures)
+
+    assert peak == {"generate": 2, "queue": 2}
+    assert all(result["final_score"] == 99 for result in results)
+
+
+@pytest.mark.asyncio
+async def test_pipeline_job_error_does_not_stop_others(monkeypatch):
+    async def evaluate(image_path, prompt, **kwargs):
+        if prompt == "bad":
+            raise RuntimeError("evaluator down")
+        return {"score": 99, "feedback": "ok"}
+
+    _patch_common(monkeypatch, evaluate)
+    monkeypatch.setattr(
+        pipeline.image_gen,
+        "generate_image",
+        AsyncMock(return_value={"image_path": "img.png", "response_id": "r"}),
+    )
+
+    async with pipeline.Pipeline("high", "1024x1024", "transparent", "png") as runner:
+        bad = await runner.submit("bad")
+        good = await runner.submit("good")
+        with pytest.raises(RuntimeError, match="evaluator down"):
+            await bad
+        assert (await good)["final_score"] == 99
+
+
+def test_pipeline_rejects_deadlocking_in_flight_limit():
+    stages = {name: pipeline.StageConfig(workers=1, queue_size=1) for name in pipeline.STAGES}
+    with pytest.raises(ValueError):
+        pipeline.Pipeline("high", "1024x1024", "transparent", "png", stages=stages, max_in_flight=6)
+    assert pipeline.Pipeline("high", "1024x1024", "transparent", "png", stages=stages).max_in_flight == 5
@@ -0,0 +1,53 @@
+from agentic_image_gen import prompt_index
+from agentic_image_gen.prompt_index import PromptIndex, PromptRecord
+
+
+def _records():
+    return [
+        PromptRecord(
+            "gold diamond engagement ring",
+            "gold diamond engagement ring, sharp focus on prongs, even diffused lighting",
+            96,
+        ),
+        PromptRecord("silver pearl necklace", "silver pearl necklace, soft rim light", 92),
+        PromptRecord("gold diamond ring", "gold diamond ring, dramatic shadows", 40),
+    ]
+
+
+def test_search_ranks_similar_winning_prompts():
+    index = PromptIndex(_records())
+
+    matches = index.search("platinum diamond engagement ring")
+
+    assert [record.user_prompt for record, _ in matches] == ["gold diamond engagement ring"]
+    assert index.search("") == []
+
+
+def test_warm_start_prompt_roundtrip(tmp_path):
+    path = tmp_path / "history.jsonl"
+    for record in _records():
+        prompt_index.append_record(path, record)
+
+    prompt = prompt_index.warm_start_prompt("Platinum diamond engagement ring.", path)
+
+    assert prompt == (
+        "Platinum diamond engagement ring. sharp focus on prongs, even diffused lighting."
+    )
+    assert prompt_index.warm_start_prompt("wooden chair", path) == "wooden chair"
+
+
+def test_load_records_skips_malformed_lines(tmp_path):
+    path = tmp_path / "history.jsonl"
+    path.write_text('{"user_prompt": "a", "final_prompt": "b", "score": 90}\nnot json\n')
+
+    assert prompt_index.load_records(path) == [PromptRecord("a", "b", 90)]
+    assert prompt_index.load_records(tmp_path / "missing.jsonl") == []
+
+
+def test_load_records_keeps_most_recent(tmp_path):
+    path = tmp_path / "history.jsonl"
+    for score in range(5):
+        prompt_index.append_record(path, PromptRecord(f"p{score}", "f", score))
+
+    assert [r.score for r in prompt_index.load_records(path, limit=2)] == [3, 4]
+    assert len(prompt_index.load_records(path, limit=None)) == 5
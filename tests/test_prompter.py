@@ -16,3 +16,19 @@ async def test_generate_prompt(monkeypatch):
     result = await prompter.generate_prompt("old", "feedback")
 
     assert result == "new prompt"
+
+
+@pytest.mark.anyio("asyncio")
+async def test_generate_prompt_includes_history(monkeypatch):
+    mock_client = MagicMock()
+    mock_response = MagicMock()
+    mock_response.choices = [MagicMock(message=MagicMock(content="new prompt"))]
+    mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
+    monkeypatch.setattr(prompter, "AsyncOpenAI", MagicMock(return_value=mock_client))
+
+    await prompter.generate_prompt("old", "feedback", history="- Iteration 1 (score 40)")
+
+    messages = mock_client.chat.completions.create.await_args.kwargs["messages"]
+    assert messages[1]["content"] == (
+        "Earlier attempts:\n- Iteration 1 (score 40)\n\nPrompt: old\nFeedback: feedback"
+    )
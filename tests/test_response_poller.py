@@ -0,0 +1,70 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from agentic_image_gen import response_poller
+
+
+def _client(statuses):
+    """Fake client whose retrieve returns each ID's statuses in turn."""
+    remaining = {response_id: list(values) for response_id, values in statuses.items()}
+    client = MagicMock()
+
+    async def retrieve(response_id):
+        values = remaining[response_id]
+        value = values.pop(0) if len(values) > 1 else values[0]
+        if isinstance(value, Exception):
+            raise value
+        return SimpleNamespace(id=response_id, status=value)
+
+    client.responses.retrieve = AsyncMock(side_effect=retrieve)
+    return client
+
+
+@pytest.mark.asyncio
+async def test_wait_multiplexes_pending_responses():
+    client = _client({
+        "resp_a": ["queued", "in_progress", "completed"],
+        "resp_b": ["in_progress", "failed"],
+        "resp_c": ["completed"],
+    })
+    poller = response_poller.ResponsePoller(client=client, interval=0.001)
+
+    results = await asyncio.gather(
+        poller.wait("resp_a"), poller.wait("resp_b"), poller.wait("resp_c"), poller.wait("resp_c")
+    )
+
+    assert [r.status for r in results] == ["completed", "failed", "completed", "completed"]
+    assert poller.pending == 0
+    # resp_c is polled once for both waiters.
+    polled = [call.args[0] for call in client.responses.retrieve.await_args_list]
+    assert polled.count("resp_c") == 1
+    assert polled.count("resp_a") == 3
+
+
+@pytest.mark.asyncio
+async def test_wait_retries_transient_errors_then_gives_up(monkeypatch):
+    monkeypatch.setattr(response_poller, "MAX_RETRIEVE_FAILURES", 3)
+    client = _client({
+        "resp_ok": [ConnectionError("reset"), "completed"],
+        "resp_gone": [ConnectionError("reset")],
+    })
+    poller = response_poller.ResponsePoller(client=client, interval=0.001)
+
+    ok = await poller.wait("resp_ok")
+    assert ok.status == "completed"
+    with pytest.raises(ConnectionError):
+        await poller.wait("resp_gone")
+    assert poller.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_wait_timeout_stops_polling():
+    client = _client({"resp_slow": ["in_progress"]})
+    poller = response_poller.ResponsePoller(client=client, interval=0.001)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await poller.wait("resp_slow", timeout=0.02)
+    assert poller.pending == 0
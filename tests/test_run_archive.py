@@ -0,0 +1,73 @@
+import time
+
+from agentic_image_gen import run_archive
+
+
+def _run(category, score, iterations, started_at=None):
+    return {
+        "started_at": started_at or time.time(),
+        "finished_at": time.time(),
+        "category": category,
+        "prompt": f"{category} prompt",
+        "quality": "high",
+        "size": "1024x1024",
+        "background": "transparent",
+        "output_format": "png",
+        "evaluation_fidelity": "full",
+        "thread_id": "t1",
+        "best_image_path": "/tmp/img.png",
+        "final_score": score,
+        "iterations": iterations,
+        "threshold_met": int(score >= 95),
+    }
+
+
+def test_record_and_query(tmp_path):
+    db = tmp_path / "archive.sqlite3"
+    history = [
+        {"prompter_query": "p1", "result_image": "a.png", "evaluator_query": "fb1", "score": 60},
+        {
+            "prompter_query": "p2",
+            "result_image": "b.png",
+            "evaluator_query": "fb1",
+            "score": 60,
+            "duplicate_of": 0,
+        },
+    ]
+    details = [
+        {"response_id": "r1", "image_hash": "00ff", "generation_seconds": 9.5, "evaluation_seconds": 2.0},
+        {"response_id": "r2", "image_hash": "00fe", "generation_seconds": 8.0},
+    ]
+
+    run_id = run_archive.record_run(db, _run("rings", 60, 2), history, details)
+    run_archive.record_run(db, _run("rings", 97, 3), [], [])
+    run_archive.record_run(db, _run("necklaces", 96, 1), [], [])
+    run_archive.record_run(db, _run("rings", 99, 1, started_at=time.time() - 30 * 86400), [], [])
+
+    iterations = run_archive.get_iterations(db, run_id)
+    assert [row["response_id"] for row in iterations] == ["r1", "r2"]
+    assert iterations[1]["duplicate_of"] == 0
+    assert iterations[1]["evaluation_seconds"] is None
+
+    stats = {row["category"]: row for row in run_archive.run_stats(db, since_days=7)}
+    assert stats["rings"]["runs"] == 2
+    assert stats["rings"]["threshold_rate"] == 0.5
+    assert stats["rings"]["avg_iterations_to_threshold"] == 3
+    assert stats["necklaces"]["avg_final_score"] == 96
+
+    recent = run_archive.list_runs(db, category="rings", limit=2)
+    assert [row["final_score"] for row in recent] == [97, 60]
+
+
+def test_queries_use_indexes(tmp_path):
+    db = tmp_path / "archive.sqlite3"
+    with run_archive.connect(db) as conn:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM runs WHERE category = ? AND started_at >= ?",
+            ("rings", 0),
+        ).fetchall()
+        iteration_plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM iterations WHERE run_id = ? ORDER BY iteration", (1,)
+        ).fetchall()
+    assert "runs_category_started_at" in " ".join(row["detail"] for row in plan)
+    assert "iterations_run_iteration" in " ".join(row["detail"] for row in iteration_plan)
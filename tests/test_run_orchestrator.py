@@ -69,3 +69,32 @@ async def test_run_and_stream_collects_tool_calls(monkeypatch):
     )
     handler.until_done.assert_awaited()
     assert result == [{"id": "call1", "type": "function", "name": "foo", "arguments": "{}"}]
+
+
+@pytest.mark.asyncio
+async def test_run_and_stream_truncates_thread(monkeypatch):
+    handler = MagicMock()
+    handler.until_done = AsyncMock()
+    handler.get_final_run_steps = AsyncMock(return_value=[])
+
+    class FakeStream:
+        async def __aenter__(self):
+            return handler
+
+        async def __aexit__(self, exc_type, exc, tb):
+            pass
+
+    fake_client = MagicMock()
+    fake_client.beta.threads.runs.stream.return_value = FakeStream()
+    monkeypatch.setattr(ro, "get_async_client", lambda: fake_client)
+    monkeypatch.setattr(ro, "AsyncAssistantEventHandler", lambda: handler)
+
+    result = await ro.run_and_stream("thread_123", "asst_123", max_recent_messages=4)
+
+    fake_client.beta.threads.runs.stream.assert_called_once_with(
+        thread_id="thread_123",
+        assistant_id="asst_123",
+        event_handler=handler,
+        truncation_strategy={"type": "last_messages", "last_messages": 4},
+    )
+    assert result == []
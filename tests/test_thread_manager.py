@@ -1,5 +1,5 @@
 import json
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
@@ -13,9 +13,9 @@ async def test_create_thread_writes_config(tmp_path, monkeypatch):
 
     fake_thread = MagicMock(id="thread_123")
     fake_client = MagicMock()
-    fake_client.beta.threads.create.return_value = fake_thread
+    fake_client.beta.threads.create = AsyncMock(return_value=fake_thread)
 
-    with patch("agentic_image_gen.thread_manager.get_client", return_value=fake_client):
+    with patch("agentic_image_gen.thread_manager.get_async_client", return_value=fake_client):
         thread_id = await tm.create_thread()
 
     assert thread_id == "thread_123"